@@ -0,0 +1,243 @@
+"""
+Offline benchmarks for ms_graph against the local fake Graph server.
+
+Reports requests/sec, p50/p99 request latency and peak traced memory for sending email,
+paging users and uploading files, so performance regressions are caught without a tenant.
+
+Usage:
+    python -m benchmarks.run_benchmarks --emails 500 --users 20000 --latency 0.02 --throttle 0.02
+    python -m benchmarks.run_benchmarks --only users --json results.json
+
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+from ms_graph.ms_graph import ms_graph, DEFAULT_POOL_SIZE
+from ms_graph.graph_email import send_email, send_bulk_email
+from ms_graph.graph_mail_merge import mail_template, send_mail_merge
+from ms_graph.graph_users import get_users, iter_users, resolve_users
+from ms_graph.graph_sharepoint import graph_sharepoint
+from ms_graph.graph_fake_server import fake_graph_server, static_token_provider
+
+
+class request_timer:
+    """Wrap gph_object.request to record the latency of every call made through it."""
+
+    def __init__(self, gph_object):
+        self.gph_object = gph_object
+        self.request = gph_object.request
+        self.latencies = []
+        self._lock = threading.Lock()
+        gph_object.request = self
+
+
+    def __call__(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self.request(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.latencies.append(elapsed)
+
+
+    def reset(self):
+        with self._lock:
+            self.latencies = []
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(pct / 100 * len(values)) - 1))
+    return values[index]
+
+
+def run(name, timer, func, trace_memory=True):
+    # Time one benchmark; the result of func() is reported as the number of processed items.
+    # Peak memory includes the in-process fake server, which streams its responses.
+    timer.reset()
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        items = func()
+    finally:
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+        if trace_memory:
+            tracemalloc.stop()
+
+    latencies = list(timer.latencies)
+    return {
+        "name": name,
+        "items": items,
+        "requests": len(latencies),
+        "seconds": round(elapsed, 3),
+        "requests_per_sec": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "items_per_sec": round(items / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "peak_mib": round(peak / 2**20, 2) if peak is not None else None
+    }
+
+
+def bench_send_email(gph_object, count):
+    ok = 0
+    for i in range(count):
+        code = send_email(gph_object, f"Benchmark {i}", "Text", "Hello", "sender@contoso.com", f"user{i}@contoso.com")
+        ok += code == 0
+    return ok
+
+
+def bench_send_bulk_email(gph_object, count, workers):
+    messages = (
+        {"subject": f"Benchmark {i}", "content_type": "Text", "body": "Hello",
+         "sender": f"sender{i % 100}@contoso.com", "to_field": f"user{i}@contoso.com"}
+        for i in range(count)
+    )
+    results = send_bulk_email(gph_object, messages, max_workers=workers, sender_rate_limit=None)
+    return sum(r["code"] == 0 for r in results)
+
+
+def bench_mail_merge(gph_object, count, workers):
+    template = mail_template("Benchmark {{n}}", "HTML", "<p>Hello {{name}}</p>", "{{email}}", "{{sender}}",
+                             logger=gph_object.logger)
+    rows = ({"n": i, "name": f"User {i}", "email": f"user{i}@contoso.com", "sender": f"sender{i % 100}@contoso.com"}
+            for i in range(count))
+    results = send_mail_merge(gph_object, template, rows, max_workers=workers, sender_rate_limit=None)
+    return sum(r["code"] == 0 for r in results)
+
+
+def bench_get_users(gph_object):
+    # get_users accumulates the full directory in memory and uses the default page size
+    return len(get_users(gph_object, select_data="id,displayName,mail,jobTitle") or [])
+
+
+def bench_iter_users(gph_object, page_size):
+    count = 0
+    for _ in iter_users(gph_object, select_data="id,displayName,mail,jobTitle", page_size=page_size):
+        count += 1
+    return count
+
+
+def bench_resolve_users(gph_object, count, use_batch):
+    result = resolve_users(gph_object, [f"user{i}@contoso.com" for i in range(count)], use_batch=use_batch)
+    return len(result["found"]) if result else 0
+
+
+def bench_upload(sp, site_id, drive_id, local_file, count):
+    ok = 0
+    for i in range(count):
+        ok += sp.upload_file_graph(site_id, drive_id, f"bench/{i}", local_file)[1]
+    return ok
+
+
+def bench_download(sp, site_id, drive_id, local_folder, count, segment_workers):
+    results, ok = sp.download_files(site_id, drive_id, [f"bench/{i}.bin" for i in range(count)], local_folder,
+                                    segment_workers=segment_workers)
+    return ok
+
+
+def print_table(results):
+    columns = ["name", "items", "requests", "seconds", "requests_per_sec", "items_per_sec", "p50_ms", "p99_ms", "peak_mib"]
+    widths = [max(len(c), *(len(str(r[c])) for r in results)) for c in columns]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    for r in results:
+        print("  ".join(str(r[c]).ljust(w) for c, w in zip(columns, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ms_graph against a local fake Graph server.")
+    parser.add_argument("--emails", type=int, default=200, help="Emails sent per email benchmark")
+    parser.add_argument("--workers", type=int, default=8, help="Workers for send_bulk_email")
+    parser.add_argument("--users", type=int, default=5000, help="Users in the fake directory")
+    parser.add_argument("--page-size", type=int, default=999, help="Users per page ($top)")
+    parser.add_argument("--uploads", type=int, default=20, help="Files uploaded per upload benchmark")
+    parser.add_argument("--file-size", type=int, default=256 * 1024, help="Size in bytes of the small upload")
+    parser.add_argument("--large-file-size", type=int, default=20 * 2**20, help="Size in bytes of the chunked upload")
+    parser.add_argument("--downloads", type=int, default=4, help="Files downloaded (each --large-file-size bytes)")
+    parser.add_argument("--segment-workers", type=int, default=4, help="Concurrent Range requests per download")
+    parser.add_argument("--latency", type=float, default=0.005, help="Seconds added to every response")
+    parser.add_argument("--throttle", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds for throttled responses")
+    parser.add_argument("--pool-size", type=int, default=DEFAULT_POOL_SIZE, help="Connection pool size of the client")
+    parser.add_argument("--only", choices=["email", "users", "upload", "download"], action="append", help="Run only these groups")
+    parser.add_argument("--no-memory", action="store_true", help="Skip tracemalloc (it slows down the benchmarks)")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    logger = logging.getLogger("benchmarks")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+
+    groups = set(args.only or ["email", "users", "upload", "download"])
+    trace = not args.no_memory
+    results = []
+
+    with fake_graph_server(latency=args.latency, throttle_rate=args.throttle, retry_after=args.retry_after,
+                           user_count=args.users, file_size=args.large_file_size) as server:
+        gph_object = ms_graph("client-id", "client-secret", "tenant-id", logger, pool_size=args.pool_size,
+                              graph_url=server.url, token_provider=static_token_provider())
+        timer = request_timer(gph_object)
+        try:
+            if "email" in groups:
+                results.append(run("send_email (serial)", timer,
+                                   lambda: bench_send_email(gph_object, args.emails), trace))
+                results.append(run(f"send_bulk_email ({args.workers} workers)", timer,
+                                   lambda: bench_send_bulk_email(gph_object, args.emails, args.workers), trace))
+                results.append(run(f"send_mail_merge ({args.workers} workers)", timer,
+                                   lambda: bench_mail_merge(gph_object, args.emails, args.workers), trace))
+
+            if "users" in groups:
+                results.append(run("get_users", timer,
+                                   lambda: bench_get_users(gph_object), trace))
+                results.append(run(f"iter_users (prefetch, $top={args.page_size})", timer,
+                                   lambda: bench_iter_users(gph_object, args.page_size), trace))
+                resolve_count = min(args.users, 1000)
+                results.append(run(f"resolve_users ({resolve_count}, $batch)", timer,
+                                   lambda: bench_resolve_users(gph_object, resolve_count, True), trace))
+                results.append(run(f"resolve_users ({resolve_count}, concurrent)", timer,
+                                   lambda: bench_resolve_users(gph_object, resolve_count, False), trace))
+
+            if "upload" in groups:
+                sp = graph_sharepoint(gph_object=gph_object)
+                site_id, drive_id = sp.get_site_and_drive_id("contoso.sharepoint.com:/sites/bench", "Documents")
+                with tempfile.TemporaryDirectory() as tmp:
+                    small = os.path.join(tmp, "small.bin")
+                    large = os.path.join(tmp, "large.bin")
+                    with open(small, "wb") as f:
+                        f.write(os.urandom(args.file_size))
+                    with open(large, "wb") as f:
+                        f.truncate(args.large_file_size)
+                    results.append(run(f"upload_file_graph ({args.file_size} B)", timer,
+                                       lambda: bench_upload(sp, site_id, drive_id, small, args.uploads), trace))
+                    results.append(run(f"upload_file_graph ({args.large_file_size} B, chunked)", timer,
+                                       lambda: bench_upload(sp, site_id, drive_id, large, 1), trace))
+
+            if "download" in groups:
+                sp = graph_sharepoint(gph_object=gph_object)
+                site_id, drive_id = sp.get_site_and_drive_id("contoso.sharepoint.com:/sites/bench", "Documents")
+                with tempfile.TemporaryDirectory() as tmp:
+                    results.append(run(f"download_files ({args.downloads} x {args.large_file_size} B)", timer,
+                                       lambda: bench_download(sp, site_id, drive_id, tmp, args.downloads,
+                                                              args.segment_workers), trace))
+        finally:
+            gph_object.close()
+        stats = dict(server.stats)
+
+    print_table(results)
+    print(f"\nServer: {stats.get('requests', 0)} requests, {stats.get('throttled', 0)} throttled")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results, "server": {str(k): v for k, v in stats.items()}}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
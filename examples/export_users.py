@@ -0,0 +1,63 @@
+from ms_src.ms_graph import ms_graph
+from ms_src.graph_users import export_users, EXPORT_FORMATS
+from examples.logger import create_logger
+import argparse
+
+
+def run_export():
+    """
+    Parse client_id, client_secret and tenant_id from CLI and export users to a file.
+    The format is taken from --format or the output file extension (.ndjson, .csv, .parquet).
+    """
+    parser = argparse.ArgumentParser(description="Export users to NDJSON, CSV or Parquet via Microsoft Graph.")
+    parser.add_argument("--client-id", required=True, help="Azure AD application (client) ID")
+    parser.add_argument("--client-secret", required=True, help="Azure AD application client secret")
+    parser.add_argument("--tenant-id", required=True, help="Azure AD tenant ID")
+    parser.add_argument("--output", required=True, help="Output file (e.g. users.ndjson, users.csv, users.parquet)")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, help="Output format (default: from the file extension)")
+
+    parser.add_argument("--select_data", help="Comma-separated user properties to export (e.g. id,displayName,mail)")
+    parser.add_argument("--search_name", help="Filter users by display name (startswith)")
+    parser.add_argument("--search_title", help="Filter users by job title (startswith)")
+    parser.add_argument("--search_email", help="Filter users by email address (startswith)")
+    parser.add_argument("--search_alias", help="Filter users by alias (startswith)")
+    parser.add_argument("--search_company", help="Filter users by company name (contains)")
+    parser.add_argument("--page_size", type=int, default=999, help="Users per page (max 999)")
+
+    args = parser.parse_args()
+
+    logger = create_logger()
+
+    # Create Graph client object
+    gph_object = ms_graph(
+        client_id = args.client_id,
+        client_secret = args.client_secret,
+        tenant_id = args.tenant_id,
+        logger = logger
+    )
+
+    if gph_object.access_token is None:
+        logger.error("Cannot proceed without a valid access token.")
+        return
+
+    count = export_users(
+        gph_object,
+        args.output,
+        select_data=args.select_data,
+        fmt=args.format,
+        search_name=args.search_name,
+        search_title=args.search_title,
+        search_email=args.search_email,
+        search_alias=args.search_alias,
+        search_company=args.search_company,
+        page_size=args.page_size
+    )
+
+    if count is not None:
+        logger.info(f"Exported {count} user(s) to {args.output}.")
+    else:
+        logger.error("Failed to export users.")
+
+
+if __name__ == "__main__":
+    run_export()
@@ -18,6 +18,7 @@ def upload_file():
     parser.add_argument("--local_file_path", required=True, help="Local path of the file to be uploaded", type=str)
     parser.add_argument("--document_library", required=False, help="Root document library on the Sharepoint site", default="Documents", type=str)
     parser.add_argument("--folder_path", required=False, help="Path inside the document library", default="", type=str)
+    parser.add_argument("--id_cache_file", required=False, help="Optional JSON file caching site and drive IDs between runs", default=None, type=str)
 
     args = parser.parse_args()
 
@@ -35,52 +36,43 @@ def upload_file():
         logger.error("Cannot proceed without a valid access token.")
         return
 
-    graph_sharepoint_obj = graph_sharepoint(access_token=gph_object.access_token,
-                                            logger=logger)
+    # Route SharePoint calls through the client's connection pool
+    graph_sharepoint_obj = graph_sharepoint(gph_object=gph_object, cache_file=args.id_cache_file)
 
-    siteid = graph_sharepoint_obj.get_site_id(site_url=args.site_url)
+    # Resolve site and library in one call; IDs are cached (and persisted) for later runs
+    siteid, drive_id = graph_sharepoint_obj.get_site_and_drive_id(site_url=args.site_url, library_name=args.document_library)
     if not siteid:
         logger.error(f"Site ID could not be retrieved for site URL: {args.site_url}")
         return
 
-    all_drives = graph_sharepoint_obj.get_document_libraries(siteid)
-
-    if all_drives:
-        files_ok = 0
-        files_nok = 0
+    if not drive_id:
+        logger.error(f"Document library '{args.document_library}' was not found in document libraries on site '{args.site_url}'.")
+        logger.debug(f"The following libraries were found:")
+        for did, name in graph_sharepoint_obj.get_document_libraries(siteid) or []:
+            logger.debug(f"{name}; Drive ID: {did}")
+        return
 
-        # Looking for the desired document library
-        if args.document_library not in [d[1] for d in drive_id]:
-            logger.error(f"Document library '{args.document_library}' was not found in document libraries on site '{args.site_url}'.")
-            logger.debug(f"The following libraries were found:")
-            for did, name in drive_id:
-                logger.debug(f"{name}; Drive ID: {did}")
-            return
-        else:
-            drive_ids = [d for d in all_drives if d[1] == args.document_library]
-            drive_id = drive_ids[0][0]
+    files_ok = 0
+    files_nok = 0
 
-            # Optional, print folder content
-            content = graph_sharepoint_obj.get_folder_content(siteid, drive_id)
-            graph_sharepoint_obj.print_folder_content(content)
+    # Optional, print folder content
+    content = graph_sharepoint_obj.get_folder_content(siteid, drive_id)
+    graph_sharepoint_obj.print_folder_content(content or [])
 
-            # Uploading the file to Sharepoint
-            file_url, success = graph_sharepoint_obj.upload_file_graph(
-                site_id=siteid,
-                drive_id=drive_id,
-                folder_path=args.folder_path,
-                local_file_path=args.local_file_path
-            )
-            if success:
-                files_ok += 1
-                logger.info(f"File successfully uploaded to: {file_url}")
-            else:
-                files_nok += 1
-                logger.error(f"File upload failed: {file_url}")
-        logger.info(f"Upload summary: {files_ok} files uploaded successfully, {files_nok} files failed.")
+    # Uploading the file to Sharepoint
+    file_url, success = graph_sharepoint_obj.upload_file_graph(
+        site_id=siteid,
+        drive_id=drive_id,
+        folder_path=args.folder_path,
+        local_file_path=args.local_file_path
+    )
+    if success:
+        files_ok += 1
+        logger.info(f"File successfully uploaded to: {file_url}")
     else:
-        logger.error("No drive ID found; file upload failed.")
-
+        files_nok += 1
+        logger.error(f"File upload failed: {file_url}")
+    logger.info(f"Upload summary: {files_ok} files uploaded successfully, {files_nok} files failed.")
 
 if __name__ == "__main__":
     upload_file()
\ No newline at end of file
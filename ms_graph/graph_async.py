@@ -0,0 +1,459 @@
+"""
+Asyncio client for Microsoft Graph mirroring the email, users and SharePoint functions.
+Requires the optional aiohttp dependency (pip install "ms-graph-wrapper[async]").
+
+"""
+import asyncio
+import io
+import json
+import pathlib as pl
+import threading
+import time
+from urllib.parse import quote
+
+try:
+    import aiohttp
+except ImportError:  # optional dependency
+    aiohttp = None
+
+from .graph_token import token_provider
+from .ms_graph import GRAPH_URL
+from .graph_metrics import graph_metrics
+from .graph_email import build_message, build_attachment, split_attachments, _attachment_name_and_type, \
+    _attachment_size, LARGE_ATTACHMENT_THRESHOLD, UPLOAD_SESSION_MIN_SIZE, ATTACHMENT_CHUNK_SIZE
+from .graph_users import _build_user_query
+from .graph_sharepoint import _item_path, LARGE_FILE_THRESHOLD
+from .graph_upload import next_expected_offset, DEFAULT_CHUNK_SIZE
+
+
+class async_response:
+    """Fully read HTTP response with the requests.Response attributes used in this package."""
+
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content) if self.content else None
+
+
+class ms_graph_async:
+    """
+    Async variant of ms_graph.
+
+    All requests share one aiohttp connection pool and at most `max_concurrency` of them are in flight
+    at the same time. 429/503 responses are retried after Retry-After. The token comes from the same
+    token_provider as the sync client and is refreshed off the event loop.
+
+    Attributes:
+        logger: Logger with .debug/.info/.warning/.error methods for logging.
+        client_id, client_secret, tenant_id: App registration used for the client credentials flow.
+        session: Optional aiohttp.ClientSession to share one connection pool between several clients.
+        pool_size: Maximum number of pooled connections when a new session is created.
+        max_concurrency: Maximum number of requests in flight.
+        timeout: Total timeout in seconds per request.
+        max_retries: Retries on 429/503 responses.
+        graph_url: Graph API root, e.g. a local stand-in server for tests and benchmarks.
+        metrics: Optional graph_metrics shared with other clients; every request is recorded in it.
+
+    Example:
+        async with ms_graph_async(client_id, client_secret, tenant_id, logger) as client:
+            results = await asyncio.gather(*(client.send_email(...) for ... in ...))
+            async for page in client.iter_user_pages(search_company="contoso"):
+                ...
+    """
+
+    def __init__(self,
+                 client_id,
+                 client_secret,
+                 tenant_id,
+                 logger,
+                 session=None,
+                 pool_size=100,
+                 max_concurrency=50,
+                 timeout=120,
+                 max_retries=3,
+                 token_cache_path=None,
+                 refresh_margin=300,
+                 graph_url=GRAPH_URL,
+                 metrics=None):
+
+        if aiohttp is None:
+            raise ImportError("ms_graph_async requires aiohttp: pip install \"ms-graph-wrapper[async]\"")
+
+        self.logger = logger
+        self.graph_url = graph_url.rstrip("/")
+        self.metrics = metrics or graph_metrics()
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._credentials = (client_id, client_secret, tenant_id, token_cache_path, refresh_margin)
+        self.token_provider = None
+        self._token_lock = threading.Lock()
+        self._owns_session = session is None
+        self.session = session
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+
+    async def __aenter__(self):
+        return self
+
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+
+    async def warm_up(self):
+        # Acquire the first token before the first request; returns True if a token was obtained
+        return await self.get_token() is not None
+
+
+    async def get_token(self):
+        # Hot path: the token is cached in memory; acquiring a new one (network) happens in a worker thread
+        token = self.token_provider.cached_token() if self.token_provider is not None else None
+        if token:
+            return token
+        return await asyncio.to_thread(self._get_token_blocking)
+
+
+    def _get_token_blocking(self):
+        # Many coroutines may ask for the first token at once; create the provider only once
+        with self._token_lock:
+            if self.token_provider is None:
+                client_id, client_secret, tenant_id, cache_path, refresh_margin = self._credentials
+                self.token_provider = token_provider(client_id, client_secret, tenant_id, self.logger,
+                                                     cache_path=cache_path, refresh_margin=refresh_margin)
+        return self.token_provider.get_token()
+
+
+    async def request(self, method, url, headers=None, auth=True, json_body=None, data=None, params=None):
+        """
+        Send a request through the shared connection pool, bounded by the concurrency semaphore.
+
+        Returns:
+            async_response with status_code, headers, text, content and json().
+        """
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.pool_size)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout))
+
+        attempt = 0
+        throttled = 0
+        start = time.perf_counter()
+        while True:
+            request_headers = dict(headers or {})
+            if auth:
+                request_headers["Authorization"] = f"Bearer {await self.get_token()}"
+            try:
+                async with self._semaphore:
+                    async with self.session.request(method, url, headers=request_headers, json=json_body,
+                                                    data=data, params=params) as resp:
+                        response = async_response(resp.status, dict(resp.headers), await resp.read())
+                        request_bytes = int(resp.request_info.headers.get("Content-Length") or 0)
+            except Exception as e:
+                self.metrics.record(method, url, latency=time.perf_counter() - start, retries=attempt,
+                                    throttled=throttled, error=e)
+                raise
+            if response.status_code in (429, 503) and attempt < self.max_retries:
+                attempt += 1
+                throttled += 1
+                wait = _retry_after(response, default=2 ** attempt)
+                self.logger.debug(f"{method} {url} throttled ({response.status_code}), retrying in {wait}s")
+                self.metrics.record_throttle_wait(method, url, wait)
+                await asyncio.sleep(wait)
+                continue
+            self.metrics.record(method, url, status=response.status_code, latency=time.perf_counter() - start,
+                                request_bytes=request_bytes, response_bytes=len(response.content),
+                                retries=attempt, throttled=throttled)
+            return response
+
+
+    async def close(self):
+        # Stop background token refresh and close the connection pool, unless it is shared
+        if self.token_provider is not None:
+            self.token_provider.close()
+        if self._owns_session and self.session is not None:
+            await self.session.close()
+            self.session = None
+
+
+    # ---- Email ----
+
+    async def send_email(self,
+                         subject,
+                         content_type,
+                         body,
+                         sender,
+                         to_field,
+                         cc_field=None,
+                         bcc_field=None,
+                         priority="Normal",
+                         attachments=None,
+                         large_attachment_threshold=LARGE_ATTACHMENT_THRESHOLD,
+                         attachment_cache=None):
+        """
+        Coroutine version of graph_email.send_email with the same parameters and return codes:
+        0 on success (202 response), 1 on exception, 2 if no access token, 3 on non-202 HTTP response.
+        """
+        try:
+            if not await self.get_token():
+                self.logger.error("Invalid Access Token, email cannot be sent!")
+                return 2
+
+            inline_attachments, large_attachments = split_attachments(attachments, large_attachment_threshold)
+            # Reading and encoding attachments is blocking work, keep it off the event loop
+            email_msg = await asyncio.to_thread(build_message, subject=subject, content_type=content_type, body=body,
+                                                to_field=to_field, cc_field=cc_field, bcc_field=bcc_field,
+                                                priority=priority, attachments=inline_attachments,
+                                                logger=self.logger, attachment_cache=attachment_cache)
+
+            self.logger.debug(f"Sending email using MS Graph from {sender}")
+            if large_attachments:
+                response = await self._send_draft(sender, email_msg, large_attachments)
+            else:
+                response = await self.request("POST", f"{self.graph_url}/users/{sender}/sendMail",
+                                              json_body=email_msg)
+
+            if response.status_code == 202:
+                self.logger.debug("Sending successful!")
+                return 0
+            self.logger.error(f"Sending Failed: {response.status_code}, {response.text}")
+            return 3
+        except Exception as e:
+            self.logger.error(f"Sending Failed: {e}")
+            return 1
+
+
+    async def _send_draft(self, sender, email_msg, large_attachments):
+        messages_url = f"{self.graph_url}/users/{sender}/messages"
+        response = await self.request("POST", messages_url, json_body=email_msg["message"])
+        if response.status_code != 201:
+            return response
+        message_url = f"{messages_url}/{quote(response.json()['id'], safe='')}"
+
+        sent = False
+        try:
+            for descriptor in large_attachments:
+                name, content_type = _attachment_name_and_type(descriptor)
+                size = _attachment_size(descriptor)
+                if size is None or size < UPLOAD_SESSION_MIN_SIZE:
+                    # Below 3 MB Graph wants a single POST instead of an upload session
+                    attachment = build_attachment(descriptor, self.logger)
+                    if attachment is None:
+                        continue
+                    response = await self.request("POST", f"{message_url}/attachments", json_body=attachment)
+                    if response.status_code not in (200, 201):
+                        return response
+                    continue
+                item = {"attachmentType": "file", "name": name, "size": size, "contentType": content_type}
+                if descriptor.get("inline"):
+                    item["isInline"] = True
+                    item["contentId"] = descriptor.get("content_id") or name
+                response = await self.request("POST", f"{message_url}/attachments/createUploadSession",
+                                              json_body={"AttachmentItem": item})
+                if response.status_code not in (200, 201):
+                    return response
+                upload_url = response.json()["uploadUrl"]
+                if descriptor.get("path"):
+                    with open(descriptor["path"], "rb") as f:
+                        response = await self._upload_chunks(upload_url, f, size, ATTACHMENT_CHUNK_SIZE)
+                else:
+                    data = descriptor["content_bytes"]
+                    data = data.encode("utf-8") if isinstance(data, str) else data
+                    response = await self._upload_bytes(upload_url, data, ATTACHMENT_CHUNK_SIZE)
+                if response.status_code not in (200, 201):
+                    return response
+            response = await self.request("POST", f"{message_url}/send")
+            sent = response.status_code == 202
+            return response
+        finally:
+            if not sent:
+                try:
+                    await self.request("DELETE", message_url)
+                except Exception as e:
+                    self.logger.warning(f"Draft {message_url} could not be deleted: {e}")
+
+
+    # ---- Users ----
+
+    async def iter_user_pages(self,
+                              select_data=None,
+                              search_name=None,
+                              search_title=None,
+                              search_email=None,
+                              search_alias=None,
+                              search_company=None,
+                              page_size=999):
+        """
+        Async iterator over pages (lists of user dicts) with the same filters as graph_users.get_users.
+        Raises graph_users_error if a page cannot be retrieved.
+        """
+        from .graph_users import graph_users_error
+
+        if not any([search_name, search_title, search_email, search_alias, search_company]):
+            self.logger.warning("No filters provided; retrieving all users may be slow in large organizations.")
+        params = _build_user_query(select_data, search_name, search_title, search_email, search_alias)
+        if page_size:
+            params["$top"] = str(page_size)
+        headers = {"ConsistencyLevel": "eventual"}
+        sc = search_company.lower() if search_company else None
+
+        url = f"{self.graph_url}/users"
+        while url:
+            resp = await self.request("GET", url, headers=headers, params=params)
+            if resp.status_code != 200:
+                self.logger.error(f"Failed to retrieve users: {resp.status_code} - {resp.text}")
+                raise graph_users_error(f"Failed to retrieve users: {resp.status_code}")
+            data = resp.json()
+            # nextLink already contains the query
+            url, params = data.get("@odata.nextLink"), None
+            users = data.get("value", [])
+            if sc:
+                users = [u for u in users if sc in (u.get("companyName") or "").lower()]
+            yield users
+
+
+    async def get_users(self, **filters):
+        """Coroutine version of graph_users.get_users; returns a list of user dicts or None on error."""
+        try:
+            users_list = []
+            async for page in self.iter_user_pages(page_size=None, **filters):
+                users_list.extend(page)
+            self.logger.debug(f"Retrieved {len(users_list)} users")
+            return users_list
+        except Exception as e:
+            self.logger.error(f"Exception occurred while searching for users: {e}")
+            return None
+
+
+    # ---- SharePoint ----
+
+    async def get_site_id(self, site_url:str):
+        try:
+            response = await self.request("GET", f"{self.graph_url}/sites/{site_url}")
+            return response.json().get("id")
+        except Exception as e:
+            self.logger.error(f"get_site_id failed: {e}")
+            return None
+
+
+    async def get_document_libraries(self, site_id:str):
+        try:
+            response = await self.request("GET", f"{self.graph_url}/sites/{site_id}/drives")
+            return [(drive["id"], drive["name"]) for drive in response.json().get("value", [])]
+        except Exception as e:
+            self.logger.error(f"get_document_libraries failed: {e}")
+            return None
+
+
+    async def get_folder_content(self, site_id:str, drive_id:str, folder_path:str=None):
+        try:
+            base = f"{self.graph_url}/sites/{site_id}/drives/{drive_id}"
+            path = "/".join(p for p in (folder_path or "").replace("\\", "/").split("/") if p)
+            url = f"{base}/root:/{quote(path)}:/children" if path else f"{base}/root/children"
+            content = []
+            while url:
+                response = await self.request("GET", url)
+                if response.status_code != 200:
+                    self.logger.error(f"get_folder_content failed: {response.status_code} - {response.text}")
+                    return None
+                data = response.json()
+                content.extend(data.get("value", []))
+                url = data.get("@odata.nextLink")
+            return content
+        except Exception as e:
+            self.logger.error(f"get_folder_content failed: {e}")
+            return None
+
+
+    async def upload_file_graph(self, site_id, drive_id:str, folder_path:str, local_file_path:str,
+                                large_file_threshold:int=LARGE_FILE_THRESHOLD, chunk_size:int=DEFAULT_CHUNK_SIZE):
+        """
+        Coroutine version of graph_sharepoint.upload_file_graph, including the upload session path
+        for files above large_file_threshold. Returns (file_url, success_file_count).
+        """
+        try:
+            file_path = pl.Path(local_file_path)
+            if not file_path.is_file():
+                raise FileNotFoundError(f"File not found: {file_path}")
+            size = file_path.stat().st_size
+            base = f"{self.graph_url}/sites/{site_id}/drives/{drive_id}/root:/{_item_path(folder_path, file_path.name)}:"
+
+            if size > large_file_threshold:
+                response = await self.request("POST", f"{base}/createUploadSession",
+                                              json_body={"item": {"@microsoft.graph.conflictBehavior": "replace"}})
+                if response.status_code != 200:
+                    self.logger.error(f"createUploadSession for {file_path.name} failed: {response.text}")
+                    return response.text, 0
+                with open(file_path, "rb") as f:
+                    response = await self._upload_chunks(response.json()["uploadUrl"], f, size, chunk_size)
+            else:
+                data = await asyncio.to_thread(file_path.read_bytes)
+                response = await self.request("PUT", f"{base}/content", data=data,
+                                              headers={"Content-Type": "application/octet-stream"})
+
+            if response.status_code in (200, 201):
+                file_url = response.json().get("webUrl", "")
+                self.logger.debug(f"File uploaded to: {file_url}")
+                return file_url, 1
+            self.logger.error(f"Upload of {file_path.name} failed: {response.text}")
+            return response.text, 0
+        except FileNotFoundError as e:
+            return str(e), 0
+        except Exception as e:
+            self.logger.error(f"upload_file_graph failed: {e}")
+            return str(e), 0
+
+
+    async def _upload_chunks(self, upload_url, file, total_size, chunk_size, max_retries=3):
+        # Async counterpart of graph_upload.upload_chunks: one chunk in memory, resume from nextExpectedRanges
+        position = 0
+        failures = 0
+        while position < total_size:
+            length = min(chunk_size, total_size - position)
+            file.seek(position)
+            data = await asyncio.to_thread(file.read, length)
+            headers = {"Content-Length": str(length),
+                       "Content-Range": f"bytes {position}-{position + length - 1}/{total_size}"}
+            try:
+                response = await self.request("PUT", upload_url, headers=headers, auth=False, data=data)
+                if response.status_code in (200, 201, 202):
+                    status = (response.json() if response.content else None) or {}
+                    if status.get("nextExpectedRanges") or response.status_code == 202:
+                        position = next_expected_offset(status, position + length)
+                        failures = 0
+                        continue
+                    return response
+                error = f"{response.status_code} - {response.text}"
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                # Timeouts are not ClientErrors; str() of a timeout is empty
+                error = str(e) or type(e).__name__
+            failures += 1
+            if failures > max_retries:
+                raise RuntimeError(f"Upload session failed at byte {position}: {error}")
+            self.logger.warning(f"Chunk at byte {position} failed ({error}); resuming")
+            await asyncio.sleep(2 ** failures)
+            try:
+                status_response = await self.request("GET", upload_url, auth=False)
+                if status_response.status_code == 200:
+                    position = next_expected_offset(status_response.json(), position)
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                # Resume from the current position; the next PUT re-syncs with the session
+                pass
+        raise RuntimeError(f"Upload session did not complete after all {total_size} bytes were sent")
+
+
+    async def _upload_bytes(self, upload_url, data, chunk_size):
+        return await self._upload_chunks(upload_url, io.BytesIO(data), len(data), chunk_size)
+
+
+def _retry_after(response, default=1):
+    try:
+        return max(float(response.headers.get("Retry-After")), 0)
+    except (TypeError, ValueError):
+        return default
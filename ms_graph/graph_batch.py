@@ -0,0 +1,205 @@
+"""
+JSON batching for Microsoft Graph: combine up to 20 requests into one /$batch round trip.
+
+"""
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+
+
+# Sub-request statuses that are retried in a later batch (424 = a dependency was throttled)
+RETRY_STATUSES = {424, 429, 503, 504}
+
+
+class graph_batch_error(Exception):
+    """Set on a request future when its sub-request failed inside a batch."""
+
+    def __init__(self, status, body):
+        self.status = status
+        self.body = body
+        super().__init__(f"Batch request failed: {status} - {body}")
+
+
+class graph_batch:
+    """
+    Queue Graph requests and send them through the /$batch endpoint.
+
+    Requests are flushed automatically whenever 20 are queued, and on flush() or when leaving
+    the `with` block. Each add() returns a concurrent.futures.Future that resolves to the
+    sub-response body, or raises graph_batch_error for a failed sub-request. Throttled (429),
+    unavailable (503/504) and dependency-failed (424) sub-requests are retried up to
+    `max_retries` times, honoring Retry-After.
+
+    Example:
+        with gph_object.batch() as batch:
+            futures = {url: batch.add("GET", f"/sites/{url}") for url in site_urls}
+        site_ids = {url: f.result()["id"] for url, f in futures.items()}
+    """
+
+    max_batch_size = 20
+
+    def __init__(self, gph_object, max_retries=3):
+        self.gph_object = gph_object
+        self.logger = gph_object.logger
+        self.max_retries = max_retries
+        self._pending = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
+
+
+    def add(self, method, url, body=None, headers=None, depends_on=None) -> Future:
+        """
+        Queue a request.
+
+        Args:
+            method: HTTP method, e.g. "GET" or "POST".
+            url: Graph URL, either relative to /v1.0 (e.g. "/users/x") or absolute.
+            body: Optional JSON body.
+            headers: Optional request headers.
+            depends_on: Optional list of futures (returned by add) that must complete first.
+
+        Returns:
+            Future resolving to the sub-response body.
+        """
+        if url.startswith(self.gph_object.graph_url):
+            url = url[len(self.gph_object.graph_url):]
+        headers = dict(headers or {})
+        if body is not None:
+            headers.setdefault("Content-Type", "application/json")
+
+        future = Future()
+        future.batch_id = str(next(self._ids))
+        entry = {
+            "id": future.batch_id,
+            "method": method.upper(),
+            "url": url,
+            "body": body,
+            "headers": headers,
+            "depends_on": list(depends_on or []),
+            "future": future,
+            "attempts": 0
+        }
+        with self._lock:
+            self._pending.append(entry)
+            full = len(self._pending) >= self.max_batch_size
+        if full:
+            self._flush_once()
+        return future
+
+
+    def flush(self):
+        # Send everything that is still queued, including retries
+        while self._flush_once():
+            pass
+
+
+    def _flush_once(self):
+        with self._flush_lock:
+            with self._lock:
+                batch = self._pending[:self.max_batch_size]
+                del self._pending[:self.max_batch_size]
+            if not batch:
+                return False
+            retry, retry_after = self._send(batch)
+            if retry:
+                self.gph_object.metrics.record_throttle_wait("POST", f"{self.gph_object.graph_url}/$batch", retry_after)
+                time.sleep(retry_after)
+                with self._lock:
+                    self._pending[:0] = retry
+            return True
+
+
+    def _send(self, batch):
+        # Build the $batch payload; dependencies outside this batch have already completed
+        ids_in_batch = {e["id"] for e in batch}
+        requests_payload = []
+        sendable = []
+        for entry in batch:
+            failed_dep = next((d for d in entry["depends_on"] if d.done() and d.exception() is not None), None)
+            if failed_dep is not None:
+                entry["future"].set_exception(graph_batch_error(424, f"Dependency {failed_dep.batch_id} failed"))
+                continue
+            req = {"id": entry["id"], "method": entry["method"], "url": entry["url"]}
+            if entry["headers"]:
+                req["headers"] = entry["headers"]
+            if entry["body"] is not None:
+                req["body"] = entry["body"]
+            depends = [d.batch_id for d in entry["depends_on"] if d.batch_id in ids_in_batch]
+            if depends:
+                req["dependsOn"] = depends
+            requests_payload.append(req)
+            sendable.append(entry)
+
+        if not sendable:
+            return [], 0
+
+        retry = []
+        retry_after = 0
+        try:
+            # A throttled envelope is requeued below, so the scheduler must not retry it as well
+            response = self.gph_object.request("POST", f"{self.gph_object.graph_url}/$batch", max_retries=0,
+                                               json={"requests": requests_payload})
+            if response.status_code != 200:
+                # The whole batch failed: retry it if throttled, otherwise fail every request
+                if response.status_code in RETRY_STATUSES:
+                    retry_after = _retry_after(response.headers.get("Retry-After"))
+                    return self._requeue(sendable, retry, response.status_code, response.text), retry_after
+                self.logger.error(f"Batch request failed: {response.status_code}, {response.text}")
+                for entry in sendable:
+                    entry["future"].set_exception(graph_batch_error(response.status_code, response.text))
+                return [], 0
+            responses = {r.get("id"): r for r in response.json().get("responses", [])}
+        except Exception as e:
+            self.logger.error(f"Batch request failed: {e}")
+            for entry in sendable:
+                entry["future"].set_exception(e)
+            return [], 0
+
+        throttled = []
+        for entry in sendable:
+            sub = responses.get(entry["id"])
+            status = sub.get("status", 0) if sub else 0
+            body = sub.get("body") if sub else None
+            if not sub or status in RETRY_STATUSES:
+                throttled.append(entry)
+                headers = {k.lower(): v for k, v in (sub or {}).get("headers", {}).items()}
+                retry_after = max(retry_after, _retry_after(headers.get("retry-after")))
+            elif status < 400:
+                entry["future"].set_result(body)
+            else:
+                entry["future"].set_exception(graph_batch_error(status, body))
+
+        if throttled:
+            self._requeue(throttled, retry, 429, "Retries exhausted")
+        return retry, retry_after
+
+
+    def _requeue(self, entries, retry, status, body):
+        # Retry entries that still have attempts left, fail the others
+        for entry in entries:
+            entry["attempts"] += 1
+            if entry["attempts"] > self.max_retries:
+                entry["future"].set_exception(graph_batch_error(status, body))
+            else:
+                retry.append(entry)
+        if retry:
+            self.logger.debug(f"Retrying {len(retry)} batched request(s)")
+        return retry
+
+
+def _retry_after(value, default=1):
+    # Retry-After is given in seconds by Graph
+    try:
+        return max(float(value), 0)
+    except (TypeError, ValueError):
+        return default
@@ -1,7 +1,25 @@
-import requests
 import base64
+import hashlib
+import heapq
+import io
+import itertools
 import os
 import mimetypes
+import threading
+import time
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+from .graph_upload import upload_chunks, CHUNK_MULTIPLE
+
+
+# sendMail requests are limited to 4 MB, so bigger attachments go through upload sessions. The threshold is
+# compared against the base64-encoded size and leaves room for the rest of the JSON body.
+LARGE_ATTACHMENT_THRESHOLD = 3 * 1024 * 1024
+# Graph only accepts attachment upload sessions from 3 MB; smaller attachments are POSTed to the draft instead
+UPLOAD_SESSION_MIN_SIZE = 3 * 1000 * 1000
+# Outlook attachment upload chunks must not exceed 4 MB
+ATTACHMENT_CHUNK_SIZE = 10 * CHUNK_MULTIPLE
 
 
 def send_email(gph_object, 
@@ -13,7 +31,9 @@ def send_email(gph_object,
                cc_field=None, 
                bcc_field=None, 
                priority="Normal", 
-               attachments=None):
+               attachments=None,
+               large_attachment_threshold=LARGE_ATTACHMENT_THRESHOLD,
+               attachment_cache=None):
     """
     Send an email using Microsoft Graph on behalf of `sender`.
 
@@ -30,6 +50,12 @@ def send_email(gph_object,
             For inline images set 'inline': True and reference them in an HTML body as <img src="cid:content_id">.
             If content_type not provided it will be guessed from the filename.
             The code will base64-encode file contents as required by Graph.
+        large_attachment_threshold: attachments are sent inline in the sendMail request while their combined
+            base64-encoded size stays below this many bytes. The others are added to a draft message, which is
+            then sent: attachments of 3 MB or more are streamed in chunks through upload sessions, smaller ones
+            are POSTed to the draft in one request.
+        attachment_cache: optional attachment_cache reusing encoded attachments across calls
+            (e.g. the same PDF or logo in a mass mailing).
 
     Returns:
         0 on success (202 response), 1 on exception, 2 if no access token, 3 on non-202 HTTP response.
@@ -40,62 +66,23 @@ def send_email(gph_object,
             gph_object.logger.error("Invalid Access Token, email cannot be sent!")
             return 2
 
-        # Parse recipient fields into Graph-friendly lists
-        to_recipients = parse_recipients(to_field)
-        cc_recipients = parse_recipients(cc_field)
-        bcc_recipients = parse_recipients(bcc_field)
-
-        # Normalize content type to one of Graph's expected values ("Text" or "HTML"), use "Text" as default
-        valid_types = {"text": "Text", "plain": "Text", "html": "HTML", "text/plain": "Text", "text/html": "HTML"}
-        content_type_normalized = valid_types.get(content_type.strip().lower(), "Text")
-
-        # Process attachments and if any contain inline items but the body is not HTML, log a warning
-        inline_found = False
-        attachments_payload = []
-        if attachments:
-            # Process all attachments in one pass
-            attachments_payload = [
-                att for desc in attachments 
-                if (att := build_attachment(descriptor=desc, logger=gph_object.logger)) is not None
-            ]
-            
-            # Check for inline attachments
-            inline_found = any(att.get("isInline") for att in attachments_payload)
-
-            # Log warning if inline attachments found with non-HTML content
-            if inline_found and content_type_normalized != "HTML":
-                gph_object.logger.warning("Inline attachments present but body is not HTML. Inline images require HTML body and <img src=\"cid:contentId\"> references.")
-
-        # Build sendMail endpoint for the configured sender user
-        endpoint = f"https://graph.microsoft.com/v1.0/users/{sender}/sendMail"
+        # Small attachments stay inline, large ones are uploaded to a draft
+        inline_attachments, large_attachments = split_attachments(attachments, large_attachment_threshold)
 
         # Compose message payload according to Graph sendMail schema
-        email_msg = {
-            "message": {
-                "subject": subject,
-                "body": {
-                    "contentType": content_type_normalized,
-                    "content": body
-                },
-                "toRecipients": to_recipients,
-                "importance": priority
-            }
-        }
+        email_msg = build_message(subject=subject,
+                                  content_type=content_type,
+                                  body=body,
+                                  to_field=to_field,
+                                  cc_field=cc_field,
+                                  bcc_field=bcc_field,
+                                  priority=priority,
+                                  attachments=inline_attachments,
+                                  logger=gph_object.logger,
+                                  attachment_cache=attachment_cache)
 
-        # Attach cc/bcc only if provided
-        if cc_recipients:
-            email_msg["message"]["ccRecipients"] = cc_recipients
-        if bcc_recipients:
-            email_msg["message"]["bccRecipients"] = bcc_recipients
-
-        # Attach attachments if any
-        if attachments_payload:
-            email_msg["message"]["attachments"] = attachments_payload
-
-        # Set authorization header with Bearer token
-        headers = {"Authorization": f"Bearer {gph_object.access_token}", "Content-Type": "application/json"}
         gph_object.logger.debug(f"Sending email using MS Graph from {sender}")
-        response = requests.post(endpoint, headers=headers, json=email_msg)
+        response = _deliver(gph_object, sender, email_msg, large_attachments)
 
         # 202 Accepted indicates Graph accepted the send request
         if response.status_code == 202:
@@ -111,6 +98,189 @@ def send_email(gph_object,
         return 1
 
 
+def build_message(subject, 
+                  content_type, 
+                  body, 
+                  to_field, 
+                  cc_field=None, 
+                  bcc_field=None, 
+                  priority="Normal", 
+                  attachments=None, 
+                  logger=None,
+                  attachment_cache=None):
+    """
+    Build the Graph sendMail payload ({"message": {...}}) for the given fields.
+    Parameters are the same as for send_email. Raises on invalid input.
+    """
+    # Parse recipient fields into Graph-friendly lists
+    to_recipients = parse_recipients(to_field)
+    cc_recipients = parse_recipients(cc_field)
+    bcc_recipients = parse_recipients(bcc_field)
+
+    # Normalize content type to one of Graph's expected values ("Text" or "HTML"), use "Text" as default
+    valid_types = {"text": "Text", "plain": "Text", "html": "HTML", "text/plain": "Text", "text/html": "HTML"}
+    content_type_normalized = valid_types.get(content_type.strip().lower(), "Text")
+
+    # Process attachments and if any contain inline items but the body is not HTML, log a warning
+    inline_found = False
+    attachments_payload = []
+    if attachments:
+        # Process all attachments in one pass
+        attachments_payload = [
+            att for desc in attachments 
+            if (att := build_attachment(descriptor=desc, logger=logger, cache=attachment_cache)) is not None
+        ]
+        
+        # Check for inline attachments
+        inline_found = any(att.get("isInline") for att in attachments_payload)
+
+        # Log warning if inline attachments found with non-HTML content
+        if inline_found and content_type_normalized != "HTML" and logger:
+            logger.warning("Inline attachments present but body is not HTML. Inline images require HTML body and <img src=\"cid:contentId\"> references.")
+
+    email_msg = {
+        "message": {
+            "subject": subject,
+            "body": {
+                "contentType": content_type_normalized,
+                "content": body
+            },
+            "toRecipients": to_recipients,
+            "importance": priority
+        }
+    }
+
+    # Attach cc/bcc only if provided
+    if cc_recipients:
+        email_msg["message"]["ccRecipients"] = cc_recipients
+    if bcc_recipients:
+        email_msg["message"]["bccRecipients"] = bcc_recipients
+
+    # Attach attachments if any
+    if attachments_payload:
+        email_msg["message"]["attachments"] = attachments_payload
+    return email_msg
+
+
+def _post_message(gph_object, sender, email_msg, max_retries=None):
+    # POST a sendMail payload (dict, or pre-serialized JSON bytes) for the sender mailbox
+    endpoint = f"{gph_object.graph_url}/users/{sender}/sendMail"
+    headers = {"Content-Type": "application/json"}
+    if isinstance(email_msg, (bytes, str)):
+        return gph_object.request("POST", endpoint, headers=headers, max_retries=max_retries, data=email_msg)
+    return gph_object.request("POST", endpoint, headers=headers, max_retries=max_retries, json=email_msg)
+
+
+def _deliver(gph_object, sender, email_msg, large_attachments=None, max_retries=None):
+    # Send via sendMail, or via a draft when some attachments do not fit inline
+    if large_attachments:
+        return _send_draft(gph_object, sender, email_msg, large_attachments, max_retries)
+    return _post_message(gph_object, sender, email_msg, max_retries)
+
+
+def _send_draft(gph_object, sender, email_msg, large_attachments, max_retries=None):
+    # Create a draft, add the attachments that did not fit inline and send it; returns the last Graph response
+    messages_url = f"{gph_object.graph_url}/users/{sender}/messages"
+    response = gph_object.request("POST", messages_url, max_retries=max_retries, json=email_msg["message"])
+    if response.status_code != 201:
+        return response
+    message_url = f"{messages_url}/{quote(response.json()['id'], safe='')}"
+
+    sent = False
+    try:
+        for descriptor in large_attachments:
+            response = _add_attachment(gph_object, message_url, descriptor)
+            if response is not None and response.status_code not in (200, 201):
+                return response
+        response = gph_object.request("POST", f"{message_url}/send", max_retries=max_retries)
+        sent = response.status_code == 202
+        return response
+    finally:
+        if not sent:
+            # Do not leave half-built drafts in the sender's mailbox
+            try:
+                gph_object.request("DELETE", message_url)
+            except Exception as e:
+                gph_object.logger.warning(f"Draft {message_url} could not be deleted: {e}")
+
+
+def _add_attachment(gph_object, message_url, descriptor):
+    # Upload session from 3 MB, a single POST below; None if the attachment could not be read (already logged)
+    size = _attachment_size(descriptor)
+    if size is not None and size >= UPLOAD_SESSION_MIN_SIZE:
+        return _upload_attachment(gph_object, message_url, descriptor)
+    attachment = build_attachment(descriptor, gph_object.logger)
+    if attachment is None:
+        return None
+    return gph_object.request("POST", f"{message_url}/attachments", json=attachment)
+
+
+def _upload_attachment(gph_object, message_url, descriptor):
+    # Stream one attachment into the draft through an attachment upload session
+    name, content_type = _attachment_name_and_type(descriptor)
+    size = _attachment_size(descriptor)
+    item = {"attachmentType": "file", "name": name, "size": size, "contentType": content_type}
+    if descriptor.get("inline"):
+        item["isInline"] = True
+        item["contentId"] = descriptor.get("content_id") or name
+    response = gph_object.request("POST", f"{message_url}/attachments/createUploadSession", json={"AttachmentItem": item})
+    if response.status_code not in (200, 201):
+        return response
+    upload_url = response.json()["uploadUrl"]
+
+    gph_object.logger.debug(f"Uploading attachment {name} ({size} bytes) in chunks")
+    if descriptor.get("path"):
+        with open(descriptor["path"], "rb") as f:
+            return upload_chunks(gph_object.request, upload_url, f, size, gph_object.logger, chunk_size=ATTACHMENT_CHUNK_SIZE)
+    data = descriptor["content_bytes"]
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return upload_chunks(gph_object.request, upload_url, io.BytesIO(data), size, gph_object.logger, chunk_size=ATTACHMENT_CHUNK_SIZE)
+
+
+def split_attachments(attachments, threshold=LARGE_ATTACHMENT_THRESHOLD):
+    """
+    Split attachment descriptors into (inline, large). Each descriptor is kept inline if its base64-encoded
+    size still fits in what is left of `threshold` bytes; the others must be added to a draft message.
+    """
+    inline, large = [], []
+    available = threshold
+    for descriptor in attachments or []:
+        size = _attachment_size(descriptor)
+        if size is not None:
+            # contentBytes are base64, 4 characters for every 3 bytes
+            size = 4 * ((size + 2) // 3)
+        if size is not None and size > available:
+            large.append(descriptor)
+        else:
+            inline.append(descriptor)
+            available -= size or 0
+    return inline, large
+
+
+def _attachment_size(descriptor):
+    # Size in bytes without reading the content; None if unknown (build_attachment reports the error)
+    try:
+        if descriptor.get("path"):
+            return os.path.getsize(descriptor["path"])
+        data = descriptor.get("content_bytes")
+        if data is not None:
+            return len(data.encode("utf-8")) if isinstance(data, str) else len(data)
+    except OSError:
+        pass
+    return None
+
+
+def _attachment_name_and_type(descriptor):
+    name = descriptor.get("name")
+    content_type_guess = None
+    if descriptor.get("path"):
+        name = name or os.path.basename(descriptor["path"])
+        content_type_guess = mimetypes.guess_type(descriptor["path"])[0]
+    content_type = descriptor.get("content_type") or content_type_guess or "application/octet-stream"
+    return name or "attachment", content_type
+
+
 # Convert a comma-separated string of addresses into the Graph recipient JSON format.
 def parse_recipients(field):
     if not field:
@@ -119,18 +289,26 @@ def parse_recipients(field):
 
 
 # Build Graph attachment payloads from descriptors
-def build_attachment(descriptor, logger):
+def build_attachment(descriptor, logger, cache=None):
     """
     Accepts either:
         - {'path': 'C:\\file', ...}
         - {'content_bytes': b'...', ...}
     Returns a dict suitable for Graph message attachments.
+    If an attachment_cache is given, the encoded payload is reused while the content is unchanged.
     """
     try:
         # Basic check
         if "path" not in descriptor and "content_bytes" not in descriptor:
             logger.error(f"build_attachment failed: Descriptor missing 'path' or 'content_bytes': {descriptor}")
             return None
+
+        # Serve the ready-to-send payload from the cache when the content is unchanged
+        cache_key = cache.key_for(descriptor) if cache is not None else None
+        if cache_key is not None:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                return cached
         # Determine name
         name = descriptor.get("name")
         content_type_guess = None
@@ -167,7 +345,251 @@ def build_attachment(descriptor, logger):
             attachment["isInline"] = True
             # contentId is used as cid reference in HTML body: <img src="cid:contentId">
             attachment["contentId"] = descriptor.get("content_id") or (name or "inline")
+
+        if cache_key is not None:
+            cache.put(cache_key, attachment)
         return attachment
     except Exception as e:
         logger.error(f"build_attachment: failed for descriptor {descriptor}: {e}")
-        return None
\ No newline at end of file
+        return None
+
+
+class attachment_cache:
+    """
+    LRU cache of encoded attachment payloads, bounded by the total size of the base64 content.
+
+    File attachments are keyed by path, mtime and size; in-memory attachments by a SHA-256 of their content.
+    Name, content type and inline settings are part of the key. Safe to share between threads.
+
+    Example:
+        cache = attachment_cache(max_bytes=256 * 1024 * 1024)
+        send_email(gph_object, ..., attachments=[{'path': 'logo.png', 'inline': True}], attachment_cache=cache)
+        print(cache.stats())
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key_for(self, descriptor):
+        # None when the content cannot be identified (the attachment is then built without caching)
+        options = (descriptor.get("name"), descriptor.get("content_type"),
+                   bool(descriptor.get("inline")), descriptor.get("content_id"))
+        if descriptor.get("path"):
+            try:
+                path = os.path.abspath(descriptor["path"])
+                stat = os.stat(path)
+            except OSError:
+                return None
+            return ("path", path, stat.st_mtime_ns, stat.st_size) + options
+        data = descriptor.get("content_bytes")
+        if data is None:
+            return None
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        return ("bytes", hashlib.sha256(data).hexdigest()) + options
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            # Copy so callers cannot modify the cached payload
+            return dict(entry[0])
+
+    def put(self, key, attachment):
+        size = len(attachment.get("contentBytes", "")) + 256
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (dict(attachment), size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "entries": len(self._entries), "bytes": self.current_bytes, "max_bytes": self.max_bytes}
+
+
+def send_bulk_email(gph_object, 
+                    messages, 
+                    max_workers=8, 
+                    sender_rate_limit=30, 
+                    max_retries=5,
+                    attachment_cache=None):
+    """
+    Send many emails concurrently using a bounded worker pool.
+
+    Parameters:
+        gph_object: An initialized ms_graph object.
+        messages: iterable of dicts with the keyword arguments of send_email
+            (subject, content_type, body, sender, to_field, cc_field, bcc_field, priority, attachments).
+            The iterable is consumed lazily, so generators of any size can be used.
+        max_workers: number of requests in flight at the same time.
+        sender_rate_limit: maximum messages per minute per sender mailbox (Exchange Online allows 30), None for no limit.
+        max_retries: retries per message on 429/503 responses; the retries are done by gph_object.request(),
+            whose scheduler also pauses the sender mailbox for Retry-After.
+        attachment_cache: optional attachment_cache so attachments shared by many messages are encoded once.
+
+    Returns:
+        List of result dicts in input order:
+            {"index", "sender", "to_field", "code", "status", "attempts", "error"}
+        where code follows send_email: 0 success, 1 exception, 2 no access token, 3 non-202 HTTP response.
+    """
+    def build_payload(fields):
+        inline, large = split_attachments(fields.pop("attachments", None),
+                                          fields.pop("large_attachment_threshold", LARGE_ATTACHMENT_THRESHOLD))
+        fields.setdefault("attachment_cache", attachment_cache)
+        return build_message(attachments=inline, logger=gph_object.logger, **fields), large
+
+    def jobs():
+        for index, msg in enumerate(messages):
+            fields = dict(msg)
+            sender = fields.pop("sender", None)
+            if not sender:
+                # Fail this message only; the rest of the run goes on
+                gph_object.logger.error(f"Sending Failed: message {index} has no sender")
+                yield _send_result(index, None, fields.get("to_field"), 1, None, 0, "missing sender")
+                continue
+            yield index, sender, fields.get("to_field"), lambda fields=fields: build_payload(fields)
+
+    return _run_send_pipeline(gph_object, jobs(), max_workers, sender_rate_limit, max_retries)
+
+
+# Messages held back by the per-sender rate limit before the pipeline stops reading new ones
+MAX_DEFERRED_MESSAGES = 10000
+
+
+def _run_send_pipeline(gph_object, jobs, max_workers, sender_rate_limit, max_retries=None):
+    # Shared worker pool for bulk sending; jobs yield (index, sender, to_field, build_payload)
+    # where build_payload() returns (sendMail payload, large attachment descriptors),
+    # or a finished result dict for a message that cannot be sent
+    results = []
+    if not gph_object.access_token:
+        gph_object.logger.error("Invalid Access Token, emails cannot be sent!")
+        for job in jobs:
+            if isinstance(job, dict):
+                results.append(job)
+            else:
+                index, sender, to_field, _ = job
+                results.append(_send_result(index, sender, to_field, 2, None, 0, "Invalid Access Token"))
+        return results
+
+    limiter = _sender_rate_limiter(sender_rate_limit)
+    # Bound the number of queued jobs so a huge message iterable is never materialized
+    slots = threading.BoundedSemaphore(max_workers * 2)
+    lock = threading.Lock()
+    # Jobs whose sender is at its per-minute limit wait here (ready time, order, job) instead of in a worker
+    deferred = []
+    order = itertools.count()
+
+    def worker(index, sender, to_field, build_payload):
+        try:
+            result = _send_one(gph_object, index, sender, to_field, build_payload, max_retries)
+        finally:
+            slots.release()
+        with lock:
+            results.append(result)
+
+    def dispatch(job):
+        wait = limiter.try_acquire(job[1])
+        if wait > 0:
+            heapq.heappush(deferred, (time.monotonic() + wait, next(order), job))
+            return
+        slots.acquire()
+        executor.submit(worker, *job)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        jobs = iter(jobs)
+        exhausted = False
+        while not exhausted or deferred:
+            # Deferred jobs whose sender has a free slot again go first
+            while deferred and deferred[0][0] <= time.monotonic():
+                dispatch(heapq.heappop(deferred)[2])
+            if not exhausted and len(deferred) < MAX_DEFERRED_MESSAGES:
+                job = next(jobs, None)
+                if job is None:
+                    exhausted = True
+                elif isinstance(job, dict):
+                    with lock:
+                        results.append(job)
+                else:
+                    dispatch(job)
+            elif deferred:
+                time.sleep(max(0.0, deferred[0][0] - time.monotonic()))
+
+    results.sort(key=lambda r: r["index"])
+    sent = sum(1 for r in results if r["code"] == 0)
+    gph_object.logger.debug(f"Bulk send finished: {sent} sent, {len(results) - sent} failed")
+    return results
+
+
+def _send_one(gph_object, index, sender, to_field, build_payload, max_retries=None):
+    # Throttled (429/503) responses are retried inside gph_object.request(), which reports its attempts
+    attempts = 0
+    try:
+        payload, large_attachments = build_payload()
+        attempts = 1
+        response = _deliver(gph_object, sender, payload, large_attachments, max_retries)
+        attempts = getattr(response, "attempts", 1)
+        if response.status_code == 202:
+            return _send_result(index, sender, to_field, 0, 202, attempts, None)
+        gph_object.logger.error(f"Sending Failed: {response.status_code}, {response.text}")
+        return _send_result(index, sender, to_field, 3, response.status_code, attempts, response.text)
+    except Exception as e:
+        gph_object.logger.error(f"Sending Failed: {e}")
+        return _send_result(index, sender, to_field, 1, None, attempts, str(e))
+
+
+def _send_result(index, sender, to_field, code, status, attempts, error):
+    return {"index": index, "sender": sender, "to_field": to_field, "code": code,
+            "status": status, "attempts": attempts, "error": error}
+
+
+class _sender_rate_limiter:
+    # Sliding one-minute window per sender mailbox; never blocks, callers defer what cannot be sent yet
+    def __init__(self, per_minute):
+        self.per_minute = per_minute
+        self._sent = {}
+        self._swept = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self, sender):
+        # 0 if a message may be sent now (it is counted), otherwise the seconds until the sender has a free slot
+        if not self.per_minute:
+            return 0
+        key = sender.lower()
+        with self._lock:
+            now = time.monotonic()
+            if now - self._swept >= 60:
+                # Forget senders with nothing sent in the last minute
+                self._sent = {k: d for k, d in self._sent.items() if now - d[-1] < 60}
+                self._swept = now
+            sent = self._sent.get(key)
+            while sent and now - sent[0] >= 60:
+                sent.popleft()
+            if not sent:
+                sent = self._sent[key] = deque()
+            elif len(sent) >= self.per_minute:
+                return 60 - (now - sent[0])
+            sent.append(now)
+            return 0
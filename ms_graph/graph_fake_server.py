@@ -0,0 +1,493 @@
+"""
+Local stand-in for the Microsoft Graph endpoints used by this package, for tests and benchmarks.
+
+"""
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+from .graph_hash import quick_xor_hash
+
+
+class static_token_provider:
+    """Token provider returning a fixed token, for ms_graph(..., token_provider=...) against the fake server."""
+
+    def __init__(self, token="fake-token"):
+        self.token = token
+
+    def get_token(self):
+        return self.token
+
+    def cached_token(self):
+        return self.token
+
+    def close(self):
+        pass
+
+
+class fake_graph_server:
+    """
+    In-process HTTP server imitating the Graph endpoints used by this package.
+
+    Supported: POST users/{id}/sendMail, draft messages with attachments (POSTed, or upload sessions from 3 MB),
+    paginated GET /users ($top, $select, $skiptoken and "<property> in (...)" filters on mail,
+    userPrincipalName or id; other $filter/$search expressions are ignored), GET /users/delta
+    (a full enumeration, then the changes queued in `delta_changes`; see expire_delta_tokens()),
+    GET /sites/{site}, GET /sites/{id}/drives, paginated root/children, root:/path:/children and items/{id}/children,
+    PUT root:/path:/content, createUploadSession for drive items, GET root:/path and items/{id}
+    (with a @microsoft.graph.downloadUrl supporting Range requests), and POST /$batch.
+    Uploaded content is counted but not stored, and downloaded content is generated (byte i is i % 256),
+    so large transfers do not use memory. Listed files (file_00000.txt, ...) are 1024 + index bytes of that
+    generated content and report its quickXorHash.
+
+    Attributes:
+        latency: Seconds added to every response.
+        throttle_rate: Fraction (0-1) of requests answered with 429 and a Retry-After header.
+        retry_after: Retry-After value in whole seconds (as Graph sends it) for throttled responses.
+        page_size: Default page size for /users and children listings ($top overrides it, max 999).
+        user_count: Number of users in the fake directory.
+        children_count: Number of items in every drive folder.
+        file_size: Size in bytes of every file served for download.
+        port: Port to listen on, 0 picks a free port.
+        seed: Seed for the throttling decisions, so runs are reproducible.
+        delta_changes: User dicts (with "@removed" for deletions) returned by incremental users/delta calls.
+        stats: Counter of "requests", "throttled", "mails", "uploaded_bytes", "downloaded_bytes" and per-status counts.
+
+    Example:
+        with fake_graph_server(latency=0.02, throttle_rate=0.05) as server:
+            gph_object = ms_graph("id", "secret", "tenant", logger, graph_url=server.url,
+                                  token_provider=static_token_provider())
+    """
+
+    def __init__(self, latency=0.0, throttle_rate=0.0, retry_after=1, page_size=100, user_count=1000,
+                 children_count=250, file_size=1024 * 1024, port=0, seed=0):
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.page_size = page_size
+        self.user_count = user_count
+        self.children_count = children_count
+        self.file_size = file_size
+        self.port = port
+
+        self.delta_changes = []
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._forced_throttles = 0
+        self._delta_token = 1
+        self._ids = iter(range(1, 1 << 62))
+        self._uploads = {}
+        self._server = None
+        self._thread = None
+        self.stats = Counter()
+
+
+    def __enter__(self):
+        self.start()
+        return self
+
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+    @property
+    def root(self):
+        return f"http://127.0.0.1:{self.port}"
+
+
+    @property
+    def url(self):
+        # Use as ms_graph(graph_url=...)
+        return f"{self.root}/v1.0"
+
+
+    def start(self):
+        server = self
+
+        class handler(BaseHTTPRequestHandler):
+            # HTTP/1.1 keeps connections alive, like the real service
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                server._handle(self)
+
+            do_POST = do_PUT = do_PATCH = do_DELETE = do_GET
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", self.port), handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+    def _handle(self, req):
+        length = int(req.headers.get("Content-Length") or 0)
+        body = req.rfile.read(length) if length else b""
+        if self.latency:
+            time.sleep(self.latency)
+
+        if self._throttled():
+            status, headers, payload = self._throttle_response()
+        else:
+            try:
+                status, headers, payload = self._route(req.command, req.path, body, req.headers)
+            except Exception as e:
+                status, headers, payload = 500, {}, _error("generalException", str(e))
+        self._count("requests")
+        self._count(status)
+        if status == 429:
+            self._count("throttled")
+
+        if isinstance(payload, _pattern_body):
+            req.send_response(status)
+            for key, value in headers.items():
+                req.send_header(key, value)
+            req.send_header("Content-Type", "application/octet-stream")
+            req.send_header("Content-Length", str(payload.length))
+            req.end_headers()
+            for chunk in payload.chunks():
+                req.wfile.write(chunk)
+            return
+
+        data = payload if isinstance(payload, bytes) else json.dumps(payload).encode() if payload is not None else b""
+        req.send_response(status)
+        for key, value in headers.items():
+            req.send_header(key, value)
+        if data:
+            req.send_header("Content-Type", "application/json")
+        req.send_header("Content-Length", str(len(data)))
+        req.end_headers()
+        req.wfile.write(data)
+
+
+    def throttle(self, count=1):
+        # Answer the next `count` requests (or $batch sub-requests) with 429, whatever throttle_rate is
+        with self._lock:
+            self._forced_throttles += count
+
+
+    def expire_delta_tokens(self):
+        # Make every delta link handed out so far answer 410 Gone, like an expired Graph delta token
+        with self._lock:
+            self._delta_token += 1
+
+
+    def _throttled(self):
+        with self._lock:
+            if self._forced_throttles:
+                self._forced_throttles -= 1
+                return True
+            return bool(self.throttle_rate) and self._random.random() < self.throttle_rate
+
+
+    def _throttle_response(self):
+        return 429, {"Retry-After": str(int(self.retry_after))}, _error("TooManyRequests", "Too many requests")
+
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self.stats[key] += n
+
+
+    def _next_id(self):
+        with self._lock:
+            return next(self._ids)
+
+
+    def _route(self, method, raw_path, body, headers):
+        split = urlsplit(raw_path)
+        path = unquote(split.path)
+        query = {k: v[-1] for k, v in parse_qs(split.query).items()}
+
+        if path.startswith("/download/") and method == "GET":
+            return self._download(headers.get("Range"))
+        if path.startswith("/upload/"):
+            return self._upload_chunk(method, path.rsplit("/", 1)[1], body, headers)
+        if not path.startswith("/v1.0/"):
+            return 404, {}, _error("itemNotFound", path)
+        path = path[len("/v1.0"):]
+        parts = path.strip("/").split("/")
+
+        if path == "/$batch" and method == "POST":
+            return self._batch(json.loads(body or b"{}"))
+
+        if parts[0] == "users":
+            if len(parts) == 1 and method == "GET":
+                return self._users_page(query)
+            if len(parts) == 2 and parts[1] == "delta" and method == "GET":
+                return self._users_delta_page(query)
+            if len(parts) == 3 and parts[2] == "sendMail" and method == "POST":
+                self._count("mails")
+                return 202, {}, None
+            if len(parts) == 3 and parts[2] == "messages" and method == "POST":
+                return 201, {}, {"id": f"msg-{self._next_id()}"}
+            if len(parts) == 5 and parts[4] == "send" and method == "POST":
+                self._count("mails")
+                return 202, {}, None
+            if len(parts) == 4 and parts[2] == "messages" and method == "DELETE":
+                return 204, {}, None
+            if len(parts) == 5 and parts[4] == "attachments" and method == "POST":
+                return 201, {}, {"id": f"att-{self._next_id()}"}
+            if path.endswith("/attachments/createUploadSession") and method == "POST":
+                size = json.loads(body or b"{}").get("AttachmentItem", {}).get("size", 0)
+                if size < 3 * 1000 * 1000:
+                    # Like Graph: attachments under 3 MB must be POSTed to the message instead
+                    return 400, {}, _error("invalidRequest", "Attachment size must be at least 3 MB")
+                return 200, {}, self._create_upload_session(size, parts[3])
+
+        if parts[0] == "sites":
+            # Sites are addressed by ID or as "hostname:/sites/name"
+            if method == "GET" and (len(parts) == 2 or parts[1].endswith(":")):
+                site = "/".join(parts[1:])
+                digest = hashlib.sha1(site.encode()).hexdigest()
+                return 200, {}, {"id": f"{parts[1].rstrip(':')},{digest[:16]},{digest[16:32]}", "webUrl": f"{self.root}/{site}"}
+            if len(parts) == 3 and parts[2] == "drives" and method == "GET":
+                return 200, {}, {"value": [{"id": "drive-documents", "name": "Documents"},
+                                           {"id": "drive-archive", "name": "Archive"}]}
+            if len(parts) >= 5 and parts[2] == "drives":
+                return self._drive_item(method, "/".join(parts[4:]), query, body)
+
+        return 404, {}, _error("itemNotFound", f"{method} {path}")
+
+
+    def _users_page(self, query):
+        top = min(int(query.get("$top", self.page_size)), 999)
+        start = int(query.get("$skiptoken", 0))
+        select = [s for s in query.get("$select", "").split(",") if s]
+        in_filter = re.match(r"^(mail|userPrincipalName|id) in \((.*)\)$", query.get("$filter", ""))
+        if in_filter:
+            # Lookups by value: fake users are user{i}@contoso.com with an id ending in i
+            values = [v.replace("''", "'").lower() for v in re.findall(r"'((?:[^']|'')*)'", in_filter.group(2))]
+            indexes = sorted({int(m.group(1)) for m in (re.search(r"(\d+)(@contoso\.com)?$", v) for v in values) if m})
+            matches = [i for i in indexes if i < self.user_count and _fake_user(i)[in_filter.group(1)].lower() in values]
+        else:
+            matches = range(start, min(start + top, self.user_count))
+        users = []
+        for i in matches:
+            user = _fake_user(i)
+            users.append({k: user[k] for k in select if k in user} if select else user)
+
+        page = {"value": users}
+        if "$count" in query:
+            page["@odata.count"] = self.user_count
+        if not in_filter and start + top < self.user_count:
+            next_query = dict(query, **{"$skiptoken": str(start + top)})
+            page["@odata.nextLink"] = f"{self.url}/users?" + "&".join(
+                f"{quote(k)}={quote(v)}" for k, v in next_query.items()
+            )
+        return 200, {}, page
+
+
+    def _users_delta_page(self, query):
+        # Without $deltatoken: all users; with a current one: delta_changes. Both are paged by $skiptoken.
+        with self._lock:
+            current = str(self._delta_token)
+        token = query.get("$deltatoken")
+        if token is not None and token != current:
+            return 410, {}, _error("syncStateNotFound", "The delta token has expired")
+        top = min(int(query.get("$top", self.page_size)), 999)
+        start = int(query.get("$skiptoken", 0))
+        select = [s for s in query.get("$select", "").split(",") if s]
+        if token is None:
+            users = [_fake_user(i) for i in range(start, min(start + top, self.user_count))]
+            total = self.user_count
+        else:
+            users = self.delta_changes[start:start + top]
+            total = len(self.delta_changes)
+        users = [{k: v for k, v in user.items() if k in select or k in ("id", "@removed")} if select else user
+                 for user in users]
+
+        page = {"value": users}
+        if start + top < total:
+            next_query = dict(query, **{"$skiptoken": str(start + top)})
+            page["@odata.nextLink"] = f"{self.url}/users/delta?" + "&".join(
+                f"{quote(k)}={quote(v)}" for k, v in next_query.items()
+            )
+        else:
+            delta_query = {k: v for k, v in query.items() if k == "$select"}
+            delta_query["$deltatoken"] = current
+            page["@odata.deltaLink"] = f"{self.url}/users/delta?" + "&".join(
+                f"{quote(k)}={quote(v)}" for k, v in delta_query.items()
+            )
+        return 200, {}, page
+
+
+    def _drive_item(self, method, item, query, body):
+        # item is "root/children", "root:/a/b:/children", "items/{id}/children", "root:/a/b.txt:/content"
+        # or "root:/a/b.txt:/createUploadSession"
+        if (item == "root/children" or (item.startswith("root:/") and item.endswith(":/children"))
+                or (item.startswith("items/") and item.endswith("/children"))):
+            if method == "POST":
+                name = json.loads(body or b"{}").get("name", "folder")
+                return 201, {}, {"id": f"item-{self._next_id()}", "name": name, "folder": {"childCount": 0}}
+            return self._children_page(item, query)
+        if item.startswith("root:/") and item.endswith(":/content") and method == "PUT":
+            name = item[len("root:/"):-len(":/content")]
+            self._count("uploaded_bytes", len(body))
+            return 201, {}, self._drive_item_json(name, len(body))
+        if item.startswith("root:/") and item.endswith(":/createUploadSession") and method == "POST":
+            return 200, {}, self._create_upload_session(None, item[len("root:/"):-len(":/createUploadSession")])
+        if method == "GET" and ((item.startswith("root:/") and ":" not in item[len("root:/"):])
+                                or (item.startswith("items/") and item.count("/") == 1)):
+            name = item.split("/", 1)[1]
+            return 200, {}, dict(self._drive_item_json(name, self.file_size),
+                                 eTag="\"{fake},1\"",
+                                 file={"mimeType": "application/octet-stream"},
+                                 **{"@microsoft.graph.downloadUrl": f"{self.root}/download/{quote(name)}"})
+        return 404, {}, _error("itemNotFound", item)
+
+
+    def _download(self, byte_range):
+        # Pre-authenticated download URL; honors "Range: bytes=start-end"
+        start, end, status, headers = 0, self.file_size - 1, 200, {}
+        if byte_range:
+            first, _, last = byte_range.split("=", 1)[1].partition("-")
+            start = int(first)
+            end = min(int(last), self.file_size - 1) if last else self.file_size - 1
+            status = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{self.file_size}"
+        length = max(end - start + 1, 0)
+        self._count("downloaded_bytes", length)
+        return status, headers, _pattern_body(start, length)
+
+
+    def _children_page(self, item, query):
+        top = min(int(query.get("$top", self.page_size)), 999)
+        start = int(query.get("$skiptoken", 0))
+        items = []
+        for i in range(start, min(start + top, self.children_count)):
+            items.append({
+                "id": hashlib.sha1(f"{item}/{i}".encode()).hexdigest()[:16],
+                "name": f"file_{i:05d}.txt",
+                "size": 1024 + i,
+                "eTag": f"\"{{{i}}},1\"",
+                "lastModifiedDateTime": "2025-01-01T00:00:00Z",
+                "file": {"hashes": {"quickXorHash": _pattern_hash(1024 + i)}}
+            })
+        page = {"value": items}
+        if start + top < self.children_count:
+            page["@odata.nextLink"] = f"{self.url}/sites/fake/drives/fake/{quote(item)}?$top={top}&$skiptoken={start + top}"
+        return 200, {}, page
+
+
+    def _create_upload_session(self, size, name):
+        token = str(self._next_id())
+        with self._lock:
+            self._uploads[token] = {"name": name, "received": 0, "size": size}
+        return {
+            "uploadUrl": f"{self.root}/upload/{token}",
+            "expirationDateTime": "2099-01-01T00:00:00Z",
+            "nextExpectedRanges": ["0-"]
+        }
+
+
+    def _upload_chunk(self, method, token, body, headers):
+        with self._lock:
+            upload = self._uploads.get(token)
+        if upload is None:
+            return 404, {}, _error("itemNotFound", "Upload session not found")
+        if method == "GET":
+            return 200, {}, {"nextExpectedRanges": [f"{upload['received']}-"]}
+        if method == "DELETE":
+            with self._lock:
+                self._uploads.pop(token, None)
+            return 204, {}, None
+
+        # Content-Range: bytes start-end/total
+        byte_range, total = headers.get("Content-Range", "").split(" ")[-1].split("/")
+        start = int(byte_range.split("-")[0])
+        if start != upload["received"]:
+            return 416, {}, _error("invalidRange", f"Expected range starting at {upload['received']}")
+        upload["received"] += len(body)
+        self._count("uploaded_bytes", len(body))
+        if upload["received"] < int(total):
+            return 202, {}, {"nextExpectedRanges": [f"{upload['received']}-"]}
+        with self._lock:
+            self._uploads.pop(token, None)
+        return 201, {}, self._drive_item_json(upload["name"], upload["received"])
+
+
+    def _drive_item_json(self, name, size):
+        return {
+            "id": f"item-{self._next_id()}",
+            "name": name.rsplit("/", 1)[-1],
+            "size": size,
+            "webUrl": f"{self.root}/Documents/{quote(name)}"
+        }
+
+
+    def _batch(self, payload):
+        # Sub-requests are throttled independently, like the real service
+        responses = []
+        for sub in payload.get("requests", []):
+            if self._throttled():
+                status, headers, body = self._throttle_response()
+            else:
+                raw = json.dumps(sub["body"]).encode() if sub.get("body") is not None else b""
+                status, headers, body = self._route(sub["method"], "/v1.0" + sub["url"], raw, sub.get("headers", {}))
+            responses.append({"id": sub["id"], "status": status, "headers": headers, "body": body})
+        return 200, {}, {"responses": responses}
+
+
+class _pattern_body:
+    # Generated download content (byte i is i % 256), written in chunks so large files never sit in memory
+    pattern = bytes(range(256)) * 256
+
+    def __init__(self, start, length):
+        self.start = start
+        self.length = length
+
+    def chunks(self):
+        offset = self.start % 256
+        remaining = self.length
+        while remaining > 0:
+            chunk = self.pattern[offset:offset + remaining] if offset else self.pattern[:remaining]
+            offset = 0
+            remaining -= len(chunk)
+            yield chunk
+
+
+@lru_cache(maxsize=4096)
+def _pattern_hash(size):
+    # quickXorHash of generated content of this size
+    hasher = quick_xor_hash()
+    for chunk in _pattern_body(0, size).chunks():
+        hasher.update(chunk)
+    return hasher.b64digest()
+
+
+def _fake_user(i):
+    return {
+        "id": f"00000000-0000-0000-0000-{i:012d}",
+        "displayName": f"User {i:06d}",
+        "mail": f"user{i}@contoso.com",
+        "userPrincipalName": f"user{i}@contoso.com",
+        "mailNickname": f"user{i}",
+        "jobTitle": ["Engineer", "Manager", "Analyst"][i % 3],
+        "companyName": ["Contoso Ltd", "Fabrikam"][i % 2],
+        "proxyAddresses": [f"SMTP:user{i}@contoso.com"]
+    }
+
+
+def _error(code, message):
+    return {"error": {"code": code, "message": message}}
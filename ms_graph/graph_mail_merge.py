@@ -0,0 +1,185 @@
+"""
+Mail merge: compile a message template once, then send one personalized message per row.
+
+"""
+import csv
+import json
+import re
+from json.encoder import encode_basestring_ascii
+from .graph_email import build_message, parse_recipients, split_attachments, _run_send_pipeline, _send_result, \
+    LARGE_ATTACHMENT_THRESHOLD
+
+
+# Placeholders look like {{ first_name }}; single braces are left alone so CSS in HTML bodies keeps working
+PLACEHOLDER = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+
+# Markers put into the message before it is serialized, so the JSON can be split around them
+_MARK = "\x00"
+_SERIALIZED_MARK = re.compile(r'"\\u0000#(\w+)\\u0000"|\\u0000(\w+)\\u0000')
+
+
+class mail_template:
+    """
+    A sendMail message compiled once for many recipients.
+
+    Subject and body placeholders ({{name}}) are replaced with JSON-escaped row values inside the
+    pre-serialized message, recipient and sender templates are rendered with plain substitution,
+    and shared attachments are encoded once. Rendering a message is string concatenation only.
+
+    Attributes:
+        subject, content_type, body, priority: As for send_email; subject and body may contain placeholders.
+        sender: Sender mailbox, may be a placeholder such as "{{sender}}".
+        to_field, cc_field, bcc_field: Comma-separated recipients, may contain placeholders (e.g. "{{email}}").
+        attachments: Attachment descriptors shared by every message (see send_email).
+        logger: Logger used while encoding the attachments.
+        large_attachment_threshold: Shared attachments above this combined base64-encoded size are uploaded per message
+            through a draft (see send_email); the pre-serialized fast path only applies to inline attachments.
+        attachment_cache: Optional attachment_cache used while encoding the shared attachments.
+
+    Example:
+        template = mail_template("Hello {{first_name}}", "HTML", "<p>Dear {{first_name}}, ...</p>",
+                                 to_field="{{email}}", sender="news@contoso.com",
+                                 attachments=[{"path": "brochure.pdf"}], logger=logger)
+        results = send_mail_merge(gph_object, template, "recipients.csv")
+    """
+
+    def __init__(self,
+                 subject,
+                 content_type,
+                 body,
+                 to_field,
+                 sender,
+                 cc_field=None,
+                 bcc_field=None,
+                 priority="Normal",
+                 attachments=None,
+                 logger=None,
+                 large_attachment_threshold=LARGE_ATTACHMENT_THRESHOLD,
+                 attachment_cache=None):
+
+        self.sender = _compile_text(sender)
+        self.to_field = _compile_text(to_field)
+        self.recipients = {"toRecipients": self.to_field}
+        if cc_field:
+            self.recipients["ccRecipients"] = _compile_text(cc_field)
+        if bcc_field:
+            self.recipients["bccRecipients"] = _compile_text(bcc_field)
+
+        inline, self.large_attachments = split_attachments(attachments, large_attachment_threshold)
+
+        # Build the message once with markers in place of the per-row values
+        message = build_message(subject=PLACEHOLDER.sub(lambda m: f"{_MARK}{m.group(1)}{_MARK}", subject),
+                                content_type=content_type,
+                                body=PLACEHOLDER.sub(lambda m: f"{_MARK}{m.group(1)}{_MARK}", body),
+                                to_field=None,
+                                priority=priority,
+                                attachments=inline,
+                                logger=logger,
+                                attachment_cache=attachment_cache)
+        for key, pieces in self.recipients.items():
+            # Recipient lists depend on the row only if the template has placeholders
+            message["message"][key] = f"{_MARK}#{key}{_MARK}" if len(pieces) > 1 else parse_recipients(pieces[0])
+        if logger and inline and len(message["message"].get("attachments", [])) != len(inline):
+            logger.warning("Some template attachments could not be encoded and are left out")
+
+        # Split the serialized message into static bytes and (kind, name) slots; the JSON is pure ASCII
+        serialized = json.dumps(message)
+        self._pieces = []
+        self.fields = set(self.sender[1::2]) | {f for p in self.recipients.values() for f in p[1::2]}
+        position = 0
+        for match in _SERIALIZED_MARK.finditer(serialized):
+            self._pieces.append(serialized[position:match.start()].encode("ascii"))
+            if match.group(1):
+                self._pieces.append(("recipients", match.group(1)))
+            else:
+                self._pieces.append(("text", match.group(2)))
+                self.fields.add(match.group(2))
+            position = match.end()
+        self._pieces.append(serialized[position:].encode("ascii"))
+
+
+    def render(self, row):
+        """
+        Render the message for one row (a mapping of placeholder names to values).
+
+        Returns:
+            (sender, to_field, payload) where payload is the sendMail JSON body as bytes.
+
+        Raises:
+            KeyError if the row lacks a placeholder value.
+        """
+        recipients = {key: _render_text(pieces, row) for key, pieces in self.recipients.items()}
+        parts = []
+        for piece in self._pieces:
+            if isinstance(piece, bytes):
+                parts.append(piece)
+            elif piece[0] == "text":
+                parts.append(encode_basestring_ascii(_value(row, piece[1]))[1:-1].encode("ascii"))
+            else:
+                parts.append(json.dumps(parse_recipients(recipients[piece[1]])).encode("ascii"))
+        return _render_text(self.sender, row), recipients["toRecipients"], b"".join(parts)
+
+
+def send_mail_merge(gph_object,
+                    template,
+                    rows,
+                    max_workers=8,
+                    sender_rate_limit=30,
+                    max_retries=5,
+                    encoding="utf-8-sig"):
+    """
+    Send one message per row from a compiled mail_template through the bulk sending pipeline.
+
+    Parameters:
+        gph_object: An initialized ms_graph object.
+        template: A mail_template.
+        rows: Path of a CSV file with a header row, or an iterable of dicts. Consumed lazily.
+        max_workers, sender_rate_limit, max_retries: As for send_bulk_email.
+        encoding: Encoding of the CSV file.
+
+    Returns:
+        List of result dicts in row order, as returned by send_bulk_email.
+        A row missing a placeholder value fails with code 1.
+    """
+    def build_payload(row):
+        _, _, payload = template.render(row)
+        if template.large_attachments:
+            # Drafts need the message as a dict
+            return json.loads(payload), template.large_attachments
+        return payload, None
+
+    def jobs(source):
+        for index, row in enumerate(source):
+            try:
+                sender = _render_text(template.sender, row)
+                to_field = _render_text(template.to_field, row)
+            except KeyError as e:
+                gph_object.logger.error(f"Sending Failed: row {index} has no value for {e}")
+                yield _send_result(index, None, None, 1, None, 0, f"missing field {e}")
+                continue
+            if not sender:
+                gph_object.logger.error(f"Sending Failed: row {index} has no sender")
+                yield _send_result(index, None, to_field, 1, None, 0, "missing sender")
+                continue
+            yield index, sender, to_field, lambda row=row: build_payload(row)
+
+    if isinstance(rows, str):
+        with open(rows, newline="", encoding=encoding) as f:
+            return _run_send_pipeline(gph_object, jobs(csv.DictReader(f)), max_workers, sender_rate_limit, max_retries)
+    return _run_send_pipeline(gph_object, jobs(rows), max_workers, sender_rate_limit, max_retries)
+
+
+def _compile_text(text):
+    # "Hi {{a}} and {{b}}" -> ["Hi ", "a", " and ", "b", ""]: static text at even, field names at odd indexes
+    return PLACEHOLDER.split(text or "")
+
+
+def _render_text(pieces, row):
+    if len(pieces) == 1:
+        return pieces[0]
+    return "".join(piece if i % 2 == 0 else _value(row, piece) for i, piece in enumerate(pieces))
+
+
+def _value(row, field):
+    value = row[field]
+    return "" if value is None else str(value)
@@ -0,0 +1,224 @@
+"""
+Per-request instrumentation for Microsoft Graph calls: counters, latency histograms and hooks.
+
+"""
+import re
+import threading
+from bisect import bisect_left
+from urllib.parse import urlsplit
+
+
+# Histogram bucket upper bounds in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Segments that follow a collection name and identify an item, e.g. users/{id}
+_COLLECTIONS = {"users", "groups", "sites", "drives", "items", "messages", "mailFolders", "attachments",
+                "lists", "contacts", "events"}
+_KEEP = {"delta", "$count", "$value", "root", "me", "sendMail", "createUploadSession"}
+_GRAPH_ROOT = re.compile(r"^/(v1\.0|beta)(?=/|$)")
+_SITE_PATH = re.compile(r"/sites/[^/]+:/[^:]*(:|$)")
+_ITEM_PATH = re.compile(r"/root:/[^:]*(:|$)")
+_WORD = re.compile(r"^[A-Za-z$][A-Za-z.$]*$")
+
+
+def endpoint_template(method, url):
+    """
+    Reduce a request URL to a low-cardinality endpoint name for metrics, e.g.
+    "POST /users/{id}/sendMail" or "PUT /sites/{id}/drives/{id}/root:{path}:/content".
+
+    IDs, email addresses and item paths are replaced by placeholders and the query string is dropped.
+    Pre-authenticated URLs outside Graph (upload sessions, download URLs) are reduced to their host.
+    """
+    parts = urlsplit(url)
+    path = parts.path
+    if parts.netloc and not _GRAPH_ROOT.match(path):
+        return f"{method.upper()} {parts.netloc}"
+    path = _GRAPH_ROOT.sub("", path)
+    path = _SITE_PATH.sub(lambda m: "/sites/{site}" + m.group(1), path)
+    path = _ITEM_PATH.sub(lambda m: "/root:{path}" + m.group(1), path)
+
+    segments = []
+    previous = None
+    for segment in path.strip("/").split("/"):
+        if not segment:
+            continue
+        if segment.startswith("{") or segment.startswith("root:"):
+            pass
+        elif previous in _COLLECTIONS and segment not in _KEEP and not segment.startswith("microsoft.graph"):
+            segment = "{id}"
+        elif "@" in segment or not _WORD.match(segment):
+            segment = "{id}"
+        segments.append(segment)
+        previous = segment
+    return f"{method.upper()} /" + "/".join(segments)
+
+
+class graph_metrics:
+    """
+    In-memory counters and latency histograms for Graph requests, plus hook callbacks.
+
+    ms_graph.request() records every call. Each record is also passed to the registered hooks as a dict:
+        {"method", "endpoint", "url", "status", "latency", "request_bytes", "response_bytes",
+         "retries", "throttled", "error"}
+    where `endpoint` is the templated URL (see endpoint_template). Every attempt the request scheduler makes is
+    recorded on its own: `retries` counts the transport retries behind it plus one if it retries a throttled
+    attempt, and `throttled` the 429/503 responses among them. Hooks run on the calling thread and should be
+    fast; exceptions raised by a hook are ignored.
+
+    Retry-After waits outside the transport (the request scheduler, $batch retries) are added with record_throttle_wait().
+
+    Example:
+        gph_object.metrics.add_hook(lambda event: statsd.timing(event["endpoint"], event["latency"] * 1000))
+        ...
+        for endpoint, stats in gph_object.metrics.snapshot()["endpoints"].items():
+            print(endpoint, stats["requests"], stats["latency"]["p99"])
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._hooks = []
+        self._endpoints = {}
+
+
+    def add_hook(self, hook):
+        # hook(event) is called after every recorded request
+        with self._lock:
+            self._hooks = self._hooks + [hook]
+
+
+    def remove_hook(self, hook):
+        with self._lock:
+            self._hooks = [h for h in self._hooks if h is not hook]
+
+
+    def record(self, method, url, status=None, latency=0.0, request_bytes=0, response_bytes=0,
+               retries=0, throttled=0, error=None):
+        """Record one request; status is None when it failed without a response."""
+        endpoint = endpoint_template(method, url)
+        with self._lock:
+            stats = self._stats(endpoint)
+            stats["requests"] += 1
+            if error is not None:
+                stats["errors"] += 1
+            else:
+                stats["status"][status] = stats["status"].get(status, 0) + 1
+            stats["request_bytes"] += request_bytes or 0
+            stats["response_bytes"] += response_bytes or 0
+            stats["retries"] += retries
+            stats["throttled"] += throttled
+            stats["latency_sum"] += latency
+            stats["latency_counts"][bisect_left(self.buckets, latency)] += 1
+            hooks = self._hooks
+
+        if hooks:
+            event = {
+                "method": method.upper(),
+                "endpoint": endpoint,
+                "url": url,
+                "status": status,
+                "latency": latency,
+                "request_bytes": request_bytes,
+                "response_bytes": response_bytes,
+                "retries": retries,
+                "throttled": throttled,
+                "error": error
+            }
+            for hook in hooks:
+                try:
+                    hook(event)
+                except Exception:
+                    pass
+
+
+    def record_throttle_wait(self, method, url, seconds):
+        # Time spent waiting for Retry-After outside the transport
+        with self._lock:
+            stats = self._stats(endpoint_template(method, url))
+            stats["throttle_waits"] += 1
+            stats["throttle_wait_seconds"] += seconds
+
+
+    def snapshot(self):
+        """
+        Return a copy of all metrics:
+            {"endpoints": {endpoint: stats}, "totals": stats}
+        where stats holds requests, errors, status (counts per status code), request_bytes, response_bytes,
+        retries, throttled, throttle_waits, throttle_wait_seconds and latency
+        ({"count", "sum", "mean", "p50", "p90", "p99", "buckets": {upper bound: cumulative count}}).
+        """
+        with self._lock:
+            endpoints = {name: self._export(stats) for name, stats in self._endpoints.items()}
+            totals = self._new_stats()
+            for stats in self._endpoints.values():
+                for key in ("requests", "errors", "request_bytes", "response_bytes", "retries", "throttled",
+                            "throttle_waits", "throttle_wait_seconds", "latency_sum"):
+                    totals[key] += stats[key]
+                for status, count in stats["status"].items():
+                    totals["status"][status] = totals["status"].get(status, 0) + count
+                totals["latency_counts"] = [a + b for a, b in zip(totals["latency_counts"], stats["latency_counts"])]
+            return {"endpoints": endpoints, "totals": self._export(totals)}
+
+
+    def reset(self):
+        with self._lock:
+            self._endpoints = {}
+
+
+    def _stats(self, endpoint):
+        stats = self._endpoints.get(endpoint)
+        if stats is None:
+            stats = self._endpoints[endpoint] = self._new_stats()
+        return stats
+
+
+    def _new_stats(self):
+        return {
+            "requests": 0,
+            "errors": 0,
+            "status": {},
+            "request_bytes": 0,
+            "response_bytes": 0,
+            "retries": 0,
+            "throttled": 0,
+            "throttle_waits": 0,
+            "throttle_wait_seconds": 0.0,
+            "latency_sum": 0.0,
+            # One counter per bucket plus one for latencies above the last bound
+            "latency_counts": [0] * (len(self.buckets) + 1)
+        }
+
+
+    def _export(self, stats):
+        counts = stats["latency_counts"]
+        total = sum(counts)
+        cumulative, buckets = 0, {}
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            buckets[bound] = cumulative
+        exported = {k: (dict(v) if isinstance(v, dict) else v) for k, v in stats.items()
+                    if k not in ("latency_sum", "latency_counts")}
+        exported["latency"] = {
+            "count": total,
+            "sum": stats["latency_sum"],
+            "mean": stats["latency_sum"] / total if total else 0.0,
+            "p50": self._quantile(counts, 0.50),
+            "p90": self._quantile(counts, 0.90),
+            "p99": self._quantile(counts, 0.99),
+            "buckets": buckets
+        }
+        return exported
+
+
+    def _quantile(self, counts, q):
+        # Upper bound of the bucket containing the q-th latency (the last bound for the overflow bucket)
+        total = sum(counts)
+        if not total:
+            return 0.0
+        rank = q * total
+        cumulative = 0
+        for i, count in enumerate(counts):
+            cumulative += count
+            if cumulative >= rank:
+                return self.buckets[min(i, len(self.buckets) - 1)]
+        return self.buckets[-1]
@@ -0,0 +1,221 @@
+"""
+Registry of per-tenant ms_graph clients sharing one connection pool and one token cache.
+
+"""
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from .ms_graph import ms_graph, create_session, DEFAULT_POOL_SIZE, GRAPH_URL
+from .graph_token import token_provider, token_cache
+from .graph_scheduler import request_scheduler
+
+
+class ms_graph_pool:
+    """
+    Hand out ms_graph clients per tenant, built lazily on first use.
+
+    All clients share one pooled requests.Session (also used by MSAL for token requests) and one MSAL token
+    cache, keyed inside by app and tenant and optionally persisted to `token_cache_path`. Each client keeps
+    its own request scheduler, so throttling in one tenant never slows down another, and its own metrics
+    unless `metrics` is given. map()/submit() fan work out across tenants on a shared worker pool with at
+    most `per_tenant_limit` jobs running per tenant.
+
+    Attributes:
+        logger: Logger passed to every client.
+        client_id, client_secret: Default app credentials (e.g. a multi-tenant app); register() can override them.
+        pool_size: Size of the shared keep-alive connection pool.
+        max_retries: Transport retries of the shared session.
+        timeout: Default (connect, read) timeout of every client.
+        token_cache_path: Optional file persisting the shared token cache.
+        refresh_margin: Seconds before token expiry at which tokens are refreshed.
+        graph_url: Graph API root.
+        metrics: Optional graph_metrics shared by all clients.
+        scheduler_limits: Optional request_scheduler limits ({kind: (initial, maximum)}) for every tenant.
+        max_workers: Jobs running at the same time across all tenants in map()/submit().
+        per_tenant_limit: Jobs running at the same time for one tenant.
+
+    Example:
+        pool = ms_graph_pool(logger, client_id, client_secret, token_cache_path="~/.ms_graph_tokens.json")
+        pool.register("contoso.onmicrosoft.com")
+        pool.register("fabrikam.onmicrosoft.com", client_id=other_id, client_secret=other_secret)
+        users = pool.map(get_users, select_data="displayName,mail")   # {tenant: result}
+        pool.close()
+    """
+
+    def __init__(self,
+                 logger,
+                 client_id=None,
+                 client_secret=None,
+                 pool_size=DEFAULT_POOL_SIZE,
+                 max_retries=3,
+                 timeout=(10, 120),
+                 token_cache_path=None,
+                 refresh_margin=300,
+                 graph_url=GRAPH_URL,
+                 metrics=None,
+                 scheduler_limits=None,
+                 max_workers=8,
+                 per_tenant_limit=2):
+
+        self.logger = logger
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.refresh_margin = refresh_margin
+        self.graph_url = graph_url
+        self.metrics = metrics
+        self.scheduler_limits = scheduler_limits
+        self.max_workers = max_workers
+        self.per_tenant_limit = per_tenant_limit
+        self.token_cache = token_cache(token_cache_path, logger)
+
+        self._credentials = {}
+        self._clients = {}
+        # Per tenant: number of running jobs and jobs waiting for a slot
+        self._running = {}
+        self._waiting = {}
+        self._session = None
+        self._executor = None
+        self._lock = threading.Lock()
+
+
+    @property
+    def session(self):
+        # The shared pooled requests.Session, created on first use
+        with self._lock:
+            if self._session is None:
+                self._session = create_session(pool_size=self.pool_size, max_retries=self.max_retries)
+            return self._session
+
+
+    @property
+    def tenants(self):
+        # Registered tenant IDs, in registration order
+        with self._lock:
+            return list(self._credentials)
+
+
+    def register(self, tenant_id, client_id=None, client_secret=None):
+        """Add a tenant, optionally with its own app credentials instead of the pool defaults."""
+        with self._lock:
+            self._credentials[tenant_id] = (client_id or self.client_id, client_secret or self.client_secret)
+            self._running.setdefault(tenant_id, 0)
+            self._waiting.setdefault(tenant_id, deque())
+
+
+    def client(self, tenant_id):
+        """Return the ms_graph client of a registered tenant, building it on first use."""
+        gph_object = self._clients.get(tenant_id)
+        if gph_object is not None:
+            return gph_object
+        session = self.session
+        with self._lock:
+            gph_object = self._clients.get(tenant_id)
+            if gph_object is None:
+                if tenant_id not in self._credentials:
+                    raise KeyError(f"Tenant {tenant_id} is not registered")
+                client_id, client_secret = self._credentials[tenant_id]
+                provider = token_provider(client_id, client_secret, tenant_id, self.logger,
+                                          refresh_margin=self.refresh_margin,
+                                          shared_cache=self.token_cache,
+                                          http_client=session)
+                scheduler = request_scheduler(limits=self.scheduler_limits) if self.scheduler_limits else None
+                gph_object = ms_graph(client_id, client_secret, tenant_id, self.logger,
+                                      session=session,
+                                      timeout=self.timeout,
+                                      graph_url=self.graph_url,
+                                      token_provider=provider,
+                                      metrics=self.metrics,
+                                      scheduler=scheduler)
+                self._clients[tenant_id] = gph_object
+            return gph_object
+
+
+    def __getitem__(self, tenant_id):
+        return self.client(tenant_id)
+
+
+    def submit(self, tenant_id, func, *args, **kwargs) -> Future:
+        """
+        Run func(client, *args, **kwargs) for one tenant on the shared worker pool.
+        While per_tenant_limit jobs of the tenant are running, further jobs are queued without taking a worker.
+
+        Returns:
+            Future resolving to the return value of func.
+        """
+        future = Future()
+        job = (future, func, args, kwargs)
+        with self._lock:
+            if tenant_id not in self._running:
+                raise KeyError(f"Tenant {tenant_id} is not registered")
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="ms_graph_pool")
+            if self._running[tenant_id] >= self.per_tenant_limit:
+                self._waiting[tenant_id].append(job)
+                return future
+            self._running[tenant_id] += 1
+            executor = self._executor
+        executor.submit(self._run, tenant_id, job)
+        return future
+
+
+    def _run(self, tenant_id, job):
+        # Run one job, then start the tenant's next waiting job on this worker
+        while job is not None:
+            future, func, args, kwargs = job
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(func(self.client(tenant_id), *args, **kwargs))
+                except Exception as e:
+                    future.set_exception(e)
+            with self._lock:
+                waiting = self._waiting[tenant_id]
+                if waiting:
+                    job = waiting.popleft()
+                else:
+                    job = None
+                    self._running[tenant_id] -= 1
+
+
+    def map(self, func, *args, tenants=None, **kwargs) -> dict:
+        """
+        Run func(client, *args, **kwargs) once for every tenant (all registered tenants by default) concurrently.
+
+        Returns:
+            {tenant_id: return value of func}, with None for tenants where func raised (the error is logged).
+        """
+        futures = {tenant_id: self.submit(tenant_id, func, *args, **kwargs)
+                   for tenant_id in (tenants if tenants is not None else self.tenants)}
+        results = {}
+        for tenant_id, future in futures.items():
+            try:
+                results[tenant_id] = future.result()
+            except Exception as e:
+                self.logger.error(f"Tenant {tenant_id}: {e}")
+                results[tenant_id] = None
+        return results
+
+
+    def close(self):
+        # Stop the workers and token refresh timers, save the token cache and close the shared connection pool
+        with self._lock:
+            executor, self._executor = self._executor, None
+            clients, self._clients = list(self._clients.values()), {}
+            session, self._session = self._session, None
+        if executor:
+            executor.shutdown(wait=True)
+        for gph_object in clients:
+            gph_object.close()
+        self.token_cache.save()
+        if session is not None:
+            session.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,156 @@
+"""
+Client-wide request scheduler: per-resource concurrency budgets that adapt to Graph throttling.
+
+"""
+import re
+import threading
+import time
+from urllib.parse import unquote, urlsplit
+
+
+# Statuses Graph uses for throttling; both carry Retry-After
+THROTTLE_STATUSES = (429, 503)
+
+# (initial, maximum) concurrent requests per resource kind. Exchange allows 4 concurrent requests per mailbox.
+DEFAULT_LIMITS = {
+    "tenant": (32, 128),
+    "mailbox": (4, 4),
+    "site": (8, 32),
+    "host": (8, 32)
+}
+
+_MAILBOX_PATH = re.compile(r"^/users/([^/]+)/(sendMail|messages|mailFolders|events|calendar|contacts)(/|$)")
+_SITE_PATH = re.compile(r"^/sites/([^/]+)")
+_GRAPH_ROOT = re.compile(r"^/(v1\.0|beta)(?=/|$)")
+
+
+def resource_keys(url):
+    """
+    Return the budgets a request counts against, most specific first, e.g.
+    ("mailbox:someone@contoso.com", "tenant") or ("site:contoso.sharepoint.com,...", "tenant").
+
+    Pre-authenticated URLs outside Graph (upload sessions, download URLs) count against their host only.
+    """
+    parts = urlsplit(url)
+    path = parts.path
+    if parts.netloc and not _GRAPH_ROOT.match(path):
+        return (f"host:{parts.netloc.lower()}",)
+    path = _GRAPH_ROOT.sub("", path)
+
+    match = _MAILBOX_PATH.match(path)
+    if match:
+        return (f"mailbox:{unquote(match.group(1)).lower()}", "tenant")
+    match = _SITE_PATH.match(path)
+    if match:
+        # Site IDs and host:/path site addresses both identify one site
+        return (f"site:{unquote(match.group(1)).split(':')[0].lower()}", "tenant")
+    return ("tenant",)
+
+
+class _budget:
+    # AIMD concurrency limit and Retry-After pause for one resource
+    def __init__(self, initial, maximum):
+        self.limit = float(initial)
+        self.maximum = maximum
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.decreased_at = 0.0
+
+
+class request_scheduler:
+    """
+    Shared admission control for every request an ms_graph client sends.
+
+    Each request counts against a budget for its resource (sender mailbox, SharePoint site or upload host)
+    and against the tenant budget. A budget admits at most `limit` concurrent requests; the limit grows by
+    one for every `limit` successful responses (additive increase) and is halved on a 429/503 (multiplicative
+    decrease, at most once per second so a burst of throttled responses counts once). A throttled response
+    also pauses the resource for its Retry-After, and ms_graph.request() retries it once the pause is over,
+    up to `max_retries` times. Parallel callers therefore settle at the highest throughput Graph sustains
+    instead of retrying all at once.
+
+    Attributes:
+        limits: {kind: (initial, maximum)} concurrency per resource kind (tenant, mailbox, site, host).
+        max_retries: Retries of a throttled request before its 429/503 response is returned to the caller.
+        default_wait: Seconds to pause when a throttled response has no Retry-After (doubled per retry).
+        max_wait: Upper bound for a single pause.
+
+    Example:
+        # One scheduler shared by two clients of the same tenant
+        scheduler = request_scheduler(limits={"mailbox": (2, 4)})
+        gph_a = ms_graph(..., scheduler=scheduler)
+        gph_b = ms_graph(..., scheduler=scheduler)
+    """
+
+    def __init__(self, limits=None, max_retries=5, default_wait=1.0, max_wait=120.0):
+        self.limits = dict(DEFAULT_LIMITS)
+        self.limits.update(limits or {})
+        self.max_retries = max_retries
+        self.default_wait = default_wait
+        self.max_wait = max_wait
+        self._budgets = {}
+        self._cond = threading.Condition()
+
+
+    def acquire(self, url):
+        """Block until every budget of the request has a free slot and is not paused; returns the keys."""
+        keys = resource_keys(url)
+        with self._cond:
+            while True:
+                # Looked up on every pass: idle budgets may have been dropped while waiting
+                budgets = [self._budget(key) for key in keys]
+                now = time.monotonic()
+                wait = max(b.paused_until for b in budgets) - now
+                if wait <= 0 and all(b.in_flight < max(1, int(b.limit)) for b in budgets):
+                    for b in budgets:
+                        b.in_flight += 1
+                    return keys
+                self._cond.wait(wait if wait > 0 else None)
+
+
+    def release(self, keys, status=None, retry_after=None, attempt=0):
+        """
+        Free the slots taken by acquire() and adapt the limits to the response status.
+
+        Returns:
+            Seconds the resource is paused for when the response was throttled, otherwise 0.
+        """
+        pause = 0.0
+        with self._cond:
+            now = time.monotonic()
+            budgets = [self._budgets[key] for key in keys]
+            for b in budgets:
+                b.in_flight -= 1
+            if status in THROTTLE_STATUSES:
+                pause = min(retry_after if retry_after is not None else self.default_wait * 2 ** attempt, self.max_wait)
+                # The most specific resource is the one Graph throttled
+                throttled = budgets[0]
+                throttled.paused_until = max(throttled.paused_until, now + pause)
+                if now - throttled.decreased_at >= 1.0:
+                    throttled.limit = max(1.0, throttled.limit / 2)
+                    throttled.decreased_at = now
+            elif status is not None and status < 500:
+                for b in budgets:
+                    b.limit = min(b.maximum, b.limit + 1 / b.limit)
+            if len(self._budgets) > 1024:
+                # Forget idle resources (e.g. thousands of sender mailboxes) so the table stays small
+                self._budgets = {key: b for key, b in self._budgets.items()
+                                 if key == "tenant" or b.in_flight or b.paused_until > now}
+            self._cond.notify_all()
+        return pause
+
+
+    def snapshot(self):
+        # Current {key: {"limit", "in_flight", "paused_for"}} of every budget seen so far
+        with self._cond:
+            now = time.monotonic()
+            return {key: {"limit": int(b.limit), "in_flight": b.in_flight, "paused_for": max(0.0, b.paused_until - now)}
+                    for key, b in self._budgets.items()}
+
+
+    def _budget(self, key):
+        budget = self._budgets.get(key)
+        if budget is None:
+            initial, maximum = self.limits[key.split(":", 1)[0]]
+            budget = self._budgets[key] = _budget(initial, maximum)
+        return budget
@@ -1,49 +1,274 @@
 from urllib.parse import quote
+from datetime import datetime, timezone
 import pathlib as pl
-import requests
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from .ms_graph import create_session, GRAPH_URL
+from .graph_upload import upload_chunks, query_upload_session, DEFAULT_CHUNK_SIZE
+from .graph_state import load_state, save_state
+from .graph_hash import hash_cache
+
+
+# Files above this size are uploaded through an upload session instead of a single PUT
+LARGE_FILE_THRESHOLD = 4 * 1024 * 1024
+
+# Downloads are split into Range requests of this size; data is written to disk in buffers of DOWNLOAD_BUFFER_SIZE
+DOWNLOAD_SEGMENT_SIZE = 16 * 1024 * 1024
+DOWNLOAD_BUFFER_SIZE = 1024 * 1024
 
 
 class graph_sharepoint:
-    def __init__(self, access_token:str, logger):
-        self.access_token = access_token
-        self.logger = logger
+    def __init__(self, access_token:str=None, logger=None, gph_object=None, session=None, timeout=(10, 120),
+                 cache_ttl:int=3600, cache_file:str=None, graph_url:str=GRAPH_URL):
+        """
+        :param access_token: Bearer token, used when no gph_object is given
+        :param logger: Logger instance, defaults to the gph_object logger
+        :param gph_object: Optional ms_graph object; requests are then sent through its connection pool
+        :param session: Optional shared requests.Session, used when no gph_object is given
+        :param timeout: Default (connect, read) timeout, used when no gph_object is given
+        :param cache_ttl: Seconds site IDs and document library lists are cached (0 disables the cache)
+        :param cache_file: Optional JSON file to persist the site/drive ID cache between runs
+        :param graph_url: Graph API root, used when no gph_object is given
+        """
+        self.gph_object = gph_object
+        self._access_token = access_token
+        self.logger = logger or (gph_object.logger if gph_object else None)
+        self.timeout = timeout
+        self.graph_url = (gph_object.graph_url if gph_object else graph_url).rstrip("/")
+        self.session = None
+        if gph_object is None:
+            self.session = session or create_session()
+
+        # site URL -> site ID and site ID -> [(drive ID, name)], as {key: [value, expires_at]}
+        self.cache_ttl = cache_ttl
+        self.cache_file = cache_file
+        self._cache_lock = threading.Lock()
+        now = time.time()
+        cached = load_state(cache_file, default={})
+        if not isinstance(cached, dict):
+            cached = {}
+        # Skip malformed entries instead of failing the client on a damaged cache file
+        self._id_cache = {k: v for k, v in cached.items()
+                          if isinstance(v, list) and len(v) == 2 and isinstance(v[1], (int, float)) and v[1] > now}
+
+
+    @property
+    def access_token(self):
+        # Always use the client's current token so long-running jobs survive token expiry
+        if self.gph_object is not None:
+            return self.gph_object.access_token
+        return self._access_token
+
+
+    @access_token.setter
+    def access_token(self, value):
+        self._access_token = value
+
+
+    def _request(self, method, url, headers=None, auth=True, **kwargs):
+        # Route every call through the ms_graph connection pool, or through our own session
+        if self.gph_object is not None:
+            return self.gph_object.request(method, url, headers=headers, auth=auth, **kwargs)
+        headers = dict(headers or {})
+        if auth:
+            headers["Authorization"] = f"Bearer {self.access_token}"
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.request(method, url, headers=headers, **kwargs)
 
 
     def get_site_id(self, site_url:str):
-        # Request site ID
+        # Request site ID (cached for cache_ttl seconds)
+        cached = self._cache_get(f"site:{site_url}")
+        if cached:
+            return cached
         try:
-            full_url = f'https://graph.microsoft.com/v1.0/sites/{site_url}'
-            response = requests.get(full_url, 
-                                    headers={'Authorization': f'Bearer {self.access_token}'})
-            self.logger.debug(f"get_site_id response: {response.status_code} - {response.text}")
-            return response.json().get('id')  # Return the site ID
+            full_url = f'{self.graph_url}/sites/{site_url}'
+            response = self._request("GET", full_url)
+            self.logger.debug(f"get_site_id response: {response.status_code}")
+            site_id = response.json().get('id')  # Return the site ID
+            if site_id:
+                self._cache_set(f"site:{site_url}", site_id)
+            return site_id
         except Exception as e:
             self.logger.error(f"get_site_id failed: {e}")
             return None
 
 
     def get_document_libraries(self, site_id:str):
-        # Retrieve drive IDs and names associated with a site
+        # Retrieve drive IDs and names associated with a site (cached for cache_ttl seconds)
+        cached = self._cache_get(f"drives:{site_id}")
+        if cached:
+            return [tuple(d) for d in cached]
         try:
-            drives_url = f'https://graph.microsoft.com/v1.0/sites/{site_id}/drives'
-            response = requests.get(drives_url, headers={'Authorization': f'Bearer {self.access_token}'})
+            drives_url = f'{self.graph_url}/sites/{site_id}/drives'
+            response = self._request("GET", drives_url)
             drives = response.json().get('value', [])
-            return [(drive['id'], drive['name']) for drive in drives]
+            libraries = [(drive['id'], drive['name']) for drive in drives]
+            if response.status_code == 200:
+                self._cache_set(f"drives:{site_id}", libraries)
+            return libraries
         except Exception as e:
             self.logger.error(f"get_document_libraries failed: {e}")
             return None
 
 
-    def get_folder_content(self, site_id:str, drive_id:str):
-        # Get the contents of a folder
+    def get_drive_id(self, site_url:str, library_name:str):
+        """
+        Resolves a document library name on a site to its drive ID, using the site/drive ID cache.
+
+        :param site_url: Site URL as accepted by get_site_id, e.g. "contoso.sharepoint.com:/sites/TeamSite"
+        :param library_name: Document library name, e.g. "Documents" (case-insensitive)
+        :return: The drive ID, or None if the site or library cannot be resolved
+        """
+        return self.get_site_and_drive_id(site_url, library_name)[1]
+
+
+    def get_site_and_drive_id(self, site_url:str, library_name:str):
+        """
+        Like get_drive_id, but also returns the site ID that most drive operations need.
+
+        :param site_url: Site URL as accepted by get_site_id, e.g. "contoso.sharepoint.com:/sites/TeamSite"
+        :param library_name: Document library name, e.g. "Documents" (case-insensitive)
+        :return: (site_id, drive_id); drive_id is None if the library does not exist, both are None if the site cannot be resolved
+        """
+        site_id = self.get_site_id(site_url)
+        if not site_id:
+            return None, None
+        libraries = self.get_document_libraries(site_id) or []
+        for drive_id, name in libraries:
+            if name == library_name:
+                return site_id, drive_id
+        for drive_id, name in libraries:
+            if name.casefold() == library_name.casefold():
+                return site_id, drive_id
+        return site_id, None
+
+
+    def clear_cache(self):
+        # Forget cached site and drive IDs (e.g. after a library was renamed)
+        with self._cache_lock:
+            self._id_cache.clear()
+            if self.cache_file:
+                save_state(self.cache_file, {})
+
+
+    def _cache_key(self, key:str):
+        # IDs from one Graph endpoint (national cloud, fake server) are not valid against another
+        return f"{self.graph_url}|{key}"
+
+
+    def _cache_get(self, key:str):
+        with self._cache_lock:
+            entry = self._id_cache.get(self._cache_key(key))
+            if entry and entry[1] > time.time():
+                return entry[0]
+        return None
+
+
+    def _cache_set(self, key:str, value):
+        if not self.cache_ttl:
+            return
+        with self._cache_lock:
+            self._id_cache[self._cache_key(key)] = [value, time.time() + self.cache_ttl]
+            if self.cache_file:
+                try:
+                    save_state(self.cache_file, self._id_cache)
+                except Exception as e:
+                    self.logger.warning(f"Site/drive ID cache could not be saved to {self.cache_file}: {e}")
+
+
+    def get_folder_content(self, site_id:str, drive_id:str, folder_path:str=None, item_id:str=None):
+        # Get the contents of a folder (root by default), following @odata.nextLink for large folders
         try:
-            folder_url = f'https://graph.microsoft.com/v1.0/sites/{site_id}/drives/{drive_id}/root/children'
-            response = requests.get(folder_url, headers={'Authorization': f'Bearer {self.access_token}'})
-            return response.json().get('value', [])
+            folder_url = self._children_url(site_id, drive_id, folder_path, item_id)
+            content = []
+            while folder_url:
+                response = self._request("GET", folder_url)
+                if response.status_code != 200:
+                    self.logger.error(f"get_folder_content failed: {response.status_code} - {response.text}")
+                    return None
+                data = response.json()
+                content.extend(data.get('value', []))
+                folder_url = data.get('@odata.nextLink')
+            return content
         except Exception as e:
             self.logger.error(f"get_folder_content failed: {e}")
             return None
 
+
+    def crawl_folder(self, site_id:str, drive_id:str, folder_path:str=None, item_id:str=None,
+                     recursive:bool=True, max_workers:int=8, page_size:int=999):
+        """
+        Lists a folder (by path or item ID) and, optionally, all of its subfolders.
+        Pages are requested concurrently across folders with at most max_workers requests in flight,
+        and items are yielded as soon as their page arrives.
+
+        :param site_id: The SharePoint site ID
+        :param drive_id: The drive ID of the document library
+        :param folder_path: Folder path inside the library (root when neither folder_path nor item_id is given)
+        :param item_id: Folder item ID, used instead of folder_path
+        :param recursive: Walk subfolders
+        :param max_workers: Number of concurrent listing requests
+        :param page_size: Items per page ($top, max 999)
+        :return: Generator of dicts {"id", "name", "path", "is_folder", "size", "eTag", "hashes", "lastModifiedDateTime"}
+        """
+        select = "id,name,size,eTag,file,folder,lastModifiedDateTime"
+        start_path = "/".join(p for p in (folder_path or "").replace("\\", "/").split("/") if p)
+        failed = 0
+
+        def list_page(url, parent_path):
+            response = self._request("GET", url)
+            if response.status_code != 200:
+                raise RuntimeError(f"{response.status_code} - {response.text}")
+            data = response.json()
+            return data.get("value", []), data.get("@odata.nextLink"), parent_path
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            first_url = f"{self._children_url(site_id, drive_id, folder_path, item_id)}?$top={page_size}&$select={select}"
+            pending = {executor.submit(list_page, first_url, start_path)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        items, next_link, parent_path = future.result()
+                    except Exception as e:
+                        failed += 1
+                        self.logger.error(f"crawl_folder: listing failed: {e}")
+                        continue
+                    if next_link:
+                        pending.add(executor.submit(list_page, next_link, parent_path))
+                    for item in items:
+                        path = f"{parent_path}/{item['name']}" if parent_path else item["name"]
+                        is_folder = "folder" in item
+                        if is_folder and recursive and item.get("folder", {}).get("childCount", 1):
+                            url = (f"{self._children_url(site_id, drive_id, item_id=item['id'])}"
+                                   f"?$top={page_size}&$select={select}")
+                            pending.add(executor.submit(list_page, url, path))
+                        yield {
+                            "id": item.get("id"),
+                            "name": item.get("name"),
+                            "path": path,
+                            "is_folder": is_folder,
+                            "size": item.get("size"),
+                            "eTag": item.get("eTag"),
+                            "hashes": item.get("file", {}).get("hashes", {}),
+                            "lastModifiedDateTime": item.get("lastModifiedDateTime")
+                        }
+        if failed:
+            self.logger.warning(f"crawl_folder: {failed} listing request(s) failed; results are incomplete.")
+
+
+    def _children_url(self, site_id:str, drive_id:str, folder_path:str=None, item_id:str=None):
+        base = f"{self.graph_url}/sites/{site_id}/drives/{drive_id}"
+        if item_id:
+            return f"{base}/items/{item_id}/children"
+        path = "/".join(p for p in (folder_path or "").replace("\\", "/").split("/") if p)
+        if path:
+            return f"{base}/root:/{quote(path)}:/children"
+        return f"{base}/root/children"
+
     def print_folder_content(self, folder_content):
         # Display the contents of a SharePoint folder
         folders = []
@@ -64,14 +289,94 @@ class graph_sharepoint:
             print(f)
 
 
-    def upload_file_graph(self, site_id, drive_id:str, folder_path:str, local_file_path:str):
+    def sync_drive_delta(self, site_id:str, drive_id:str, state_file:str, on_change=None):
+        """
+        Returns the items added, modified or deleted in a document library since the previous call.
+        Uses drives/{drive_id}/root/delta and persists the delta link per (site, drive) in state_file,
+        so the cost of a sync depends on the amount of change, not on the size of the library.
+        The first call enumerates the whole library and reports every item as added.
+
+        :param site_id: The SharePoint site ID
+        :param drive_id: The drive ID (as returned by get_document_libraries)
+        :param state_file: JSON file holding the delta links of all synced drives
+        :param on_change: Optional callback on_change(kind, item) with kind "added", "modified" or "deleted";
+                          when given, items are passed to it instead of being collected. If the delta token
+                          expires after items were passed on, on_change("reset", None) is called before the
+                          full enumeration starts
+        :return: {"added": [...], "modified": [...], "deleted": [...], "full_sync": bool} of drive items, or None on error
+        """
+        try:
+            key = f"{site_id}|{drive_id}"
+            states = load_state(state_file, default={})
+            state = states.get(key, {})
+            delta_link = state.get("deltaLink")
+            previous_sync = _parse_time(state.get("synced_at"))
+            full_sync = delta_link is None
+            # Remember when this sync started, so changes made while it runs are picked up next time
+            started_at = datetime.now(timezone.utc)
+
+            changes = {"added": [], "modified": [], "deleted": []}
+            url = delta_link or f"{self.graph_url}/sites/{site_id}/drives/{drive_id}/root/delta"
+            while url:
+                response = self._request("GET", url)
+                if response.status_code == 410 and not full_sync:
+                    # Delta token expired: enumerate the library again
+                    self.logger.warning(f"Drive delta token for {drive_id} expired; running a full sync.")
+                    # Drop changes from the pages read before the expiry
+                    if url != delta_link and on_change:
+                        on_change("reset", None)
+                    changes = {"added": [], "modified": [], "deleted": []}
+                    full_sync = True
+                    url = f"{self.graph_url}/sites/{site_id}/drives/{drive_id}/root/delta"
+                    continue
+                if response.status_code != 200:
+                    self.logger.error(f"sync_drive_delta failed: {response.status_code} - {response.text}")
+                    return None
+
+                data = response.json()
+                for item in data.get("value", []):
+                    if "root" in item:
+                        continue
+                    if "deleted" in item:
+                        kind = "deleted"
+                    elif previous_sync is None or (_parse_time(item.get("createdDateTime")) or started_at) > previous_sync:
+                        kind = "added"
+                    else:
+                        kind = "modified"
+                    if on_change:
+                        on_change(kind, item)
+                    else:
+                        changes[kind].append(item)
+
+                url = data.get("@odata.nextLink")
+                if not url:
+                    delta_link = data.get("@odata.deltaLink")
+
+            # Re-read the state file so concurrent syncs of other drives are not overwritten
+            states = load_state(state_file, default={})
+            states[key] = {"deltaLink": delta_link, "synced_at": started_at.isoformat()}
+            save_state(state_file, states)
+
+            changes["full_sync"] = full_sync
+            self.logger.debug(f"Drive delta sync for {drive_id}: {len(changes['added'])} added, "
+                              f"{len(changes['modified'])} modified, {len(changes['deleted'])} deleted")
+            return changes
+        except Exception as e:
+            self.logger.error(f"sync_drive_delta failed: {e}")
+            return None
+
+
+    def upload_file_graph(self, site_id, drive_id:str, folder_path:str, local_file_path:str,
+                          large_file_threshold:int=LARGE_FILE_THRESHOLD):
         """
         Uploads a file to a SharePoint folder using Microsoft Graph API.
+        Files larger than large_file_threshold are uploaded in chunks through an upload session.
 
         :param site_id: The SharePoint site ID
         :param drive_id: The drive ID for the desired folder
         :param folder_path: Path inside taht folder
         :param local_file_path: Local path of the file to be uploaded
+        :param large_file_threshold: Size in bytes above which upload_large_file is used
         :return: (file_url, success_file_count)
         """
         try:
@@ -79,21 +384,22 @@ class graph_sharepoint:
             if not file_path.is_file():
                 raise FileNotFoundError(f"File not found: {file_path}")
 
+            if file_path.stat().st_size > large_file_threshold:
+                return self.upload_large_file(site_id, drive_id, folder_path, local_file_path)
+
             with open(file_path, "rb") as file:
                 file_content = file.read()
 
             # Build the upload URL
-            folder_path_encoded = quote(folder_path)
             upload_url = (
-                f"https://graph.microsoft.com/v1.0/sites/{site_id}/drives/{drive_id}/root:/{folder_path_encoded}/{file_path.name}:/content"
+                f"{self.graph_url}/sites/{site_id}/drives/{drive_id}/root:/{_item_path(folder_path, file_path.name)}:/content"
             )
 
             headers = {
-                "Authorization": f"Bearer {self.access_token}",
                 "Content-Type": "application/octet-stream"
             }
 
-            response = requests.put(upload_url, headers=headers, data=file_content)
+            response = self._request("PUT", upload_url, headers=headers, data=file_content)
             if response.status_code in [200, 201]:
                 file_info = response.json()
                 file_url = file_info.get("webUrl", "")
@@ -107,3 +413,458 @@ class graph_sharepoint:
         except Exception as e:
             self.logger.error(f"upload_file_graph failed: {e}")
             return str(e), 0
+
+
+    def upload_large_file(self, site_id, drive_id:str, folder_path:str, local_file_path:str,
+                          chunk_size:int=DEFAULT_CHUNK_SIZE, session_file:str=None):
+        """
+        Uploads a large file through a Graph upload session, streaming fixed-size chunks from disk.
+        Memory use stays at one chunk regardless of the file size.
+
+        :param site_id: The SharePoint site ID
+        :param drive_id: The drive ID for the desired folder
+        :param folder_path: Path inside that folder
+        :param local_file_path: Local path of the file to be uploaded
+        :param chunk_size: Bytes per chunk, must be a multiple of 320 KiB
+        :param session_file: Optional JSON file to persist the upload session; an interrupted upload
+                             is resumed from the last acknowledged byte when called again
+        :return: (file_url, success_file_count)
+        """
+        try:
+            file_path = pl.Path(local_file_path)
+            if not file_path.is_file():
+                raise FileNotFoundError(f"File not found: {file_path}")
+            stat = file_path.stat()
+            item_path = _item_path(folder_path, file_path.name)
+
+            # Resume a persisted session for the same unchanged file, if it has not expired
+            upload_url, offset = None, 0
+            saved = load_state(session_file)
+            if (saved and saved.get("item_path") == item_path and saved.get("drive_id") == drive_id
+                    and saved.get("size") == stat.st_size and saved.get("mtime_ns") == stat.st_mtime_ns
+                    and not _expired(saved.get("expirationDateTime"))):
+                upload_url = saved["uploadUrl"]
+                offset = query_upload_session(self._request, upload_url, default=None)
+                if offset is None:
+                    upload_url, offset = None, 0
+                else:
+                    self.logger.debug(f"Resuming upload of {file_path.name} at byte {offset}")
+
+            if upload_url is None:
+                session_url = (
+                    f"{self.graph_url}/sites/{site_id}/drives/{drive_id}/root:/{item_path}:/createUploadSession"
+                )
+                body = {"item": {"@microsoft.graph.conflictBehavior": "replace"}}
+                response = self._request("POST", session_url, json=body)
+                if response.status_code != 200:
+                    self.logger.error(f"createUploadSession for {item_path} failed: {response.text}")
+                    return response.text, 0
+                upload_session = response.json()
+                upload_url = upload_session["uploadUrl"]
+                if session_file:
+                    save_state(session_file, {
+                        "uploadUrl": upload_url,
+                        "expirationDateTime": upload_session.get("expirationDateTime"),
+                        "drive_id": drive_id,
+                        "item_path": item_path,
+                        "size": stat.st_size,
+                        "mtime_ns": stat.st_mtime_ns
+                    })
+
+            with open(file_path, "rb") as file:
+                response = upload_chunks(self._request, upload_url, file, stat.st_size, self.logger,
+                                         chunk_size=chunk_size, offset=offset)
+
+            if session_file and os.path.exists(session_file):
+                os.remove(session_file)
+            file_url = response.json().get("webUrl", "")
+            self.logger.debug(f"File uploaded to: {file_url}")
+            return file_url, 1
+        except FileNotFoundError as e:
+            return str(e), 0
+        except Exception as e:
+            self.logger.error(f"upload_large_file failed: {e}")
+            return str(e), 0
+
+
+    def upload_folder(self, site_id, drive_id:str, local_folder:str, folder_path:str="",
+                      max_workers:int=8, progress=None):
+        """
+        Uploads a local directory tree to a SharePoint folder.
+        Remote folders are created once (parent first), then files are uploaded concurrently.
+
+        :param site_id: The SharePoint site ID
+        :param drive_id: The drive ID for the desired folder
+        :param local_folder: Local directory to upload
+        :param folder_path: Destination path inside the document library
+        :param max_workers: Number of concurrent uploads
+        :param progress: Optional callback progress(done_count, total_count, result) called after each file
+        :return: (results, success_file_count) where results is a list of dicts
+                 {"local_path", "remote_path", "url", "success"} (url holds the error text on failure)
+        """
+        root = pl.Path(local_folder)
+        if not root.is_dir():
+            self.logger.error(f"upload_folder failed: folder not found: {root}")
+            return [], 0
+
+        # Collect (local file, remote folder) pairs and the remote folders they need
+        jobs = []
+        remote_dirs = set()
+        base = "/".join(p for p in (folder_path or "").replace("\\", "/").split("/") if p)
+        for dirpath, _, filenames in os.walk(root):
+            rel = pl.Path(dirpath).relative_to(root).as_posix()
+            remote_dir = "/".join(p for p in (base, "" if rel == "." else rel) if p)
+            if remote_dir:
+                remote_dirs.add(remote_dir)
+            for name in sorted(filenames):
+                jobs.append((os.path.join(dirpath, name), remote_dir))
+
+        if not self._ensure_folders(site_id, drive_id, remote_dirs, max_workers):
+            return [], 0
+        results = self._upload_files(site_id, drive_id, jobs, max_workers, progress)
+        files_ok = sum(1 for r in results if r["success"])
+        self.logger.info(f"Upload summary: {files_ok} files uploaded successfully, {len(results) - files_ok} files failed.")
+        return results, files_ok
+
+
+    def sync_folder(self, site_id, drive_id:str, local_folder:str, folder_path:str="",
+                    max_workers:int=8, hash_cache_path:str=None, progress=None):
+        """
+        Mirrors a local directory tree into a SharePoint folder, uploading only files that differ.
+        A file is skipped when a remote item with the same path has the same size and quickXorHash.
+        Local hashes are only computed when the sizes match, and are cached by path, size and mtime
+        (in hash_cache_path when given) so unchanged files are not hashed again on the next run.
+        Remote items without a local counterpart are left untouched.
+
+        :param site_id: The SharePoint site ID
+        :param drive_id: The drive ID for the desired folder
+        :param local_folder: Local directory to mirror
+        :param folder_path: Destination path inside the document library
+        :param max_workers: Number of concurrent listing requests and uploads
+        :param hash_cache_path: Optional JSON file caching local file hashes between runs
+        :param progress: Optional callback progress(done_count, total_count, result) called after each uploaded file
+        :return: (results, success_file_count) where results is a list of dicts
+                 {"local_path", "remote_path", "url", "success", "skipped"} (url holds the error text on failure,
+                 None for skipped files); skipped files count as successful
+        """
+        root = pl.Path(local_folder)
+        if not root.is_dir():
+            self.logger.error(f"sync_folder failed: folder not found: {root}")
+            return [], 0
+
+        base = "/".join(p for p in (folder_path or "").replace("\\", "/").split("/") if p)
+        # SharePoint paths are case-insensitive
+        remote = {item["path"].lower(): item for item in self.crawl_folder(site_id, drive_id, base or None,
+                                                                           max_workers=max_workers)
+                  if not item["is_folder"]}
+        cache = hash_cache(hash_cache_path)
+
+        jobs, skipped = [], []
+        remote_dirs = set()
+        for dirpath, _, filenames in os.walk(root):
+            rel = pl.Path(dirpath).relative_to(root).as_posix()
+            remote_dir = "/".join(p for p in (base, "" if rel == "." else rel) if p)
+            for name in sorted(filenames):
+                local_path = os.path.join(dirpath, name)
+                remote_path = "/".join(p for p in (remote_dir, name) if p)
+                if self._same_content(local_path, remote.get(remote_path.lower()), cache):
+                    skipped.append({"local_path": local_path, "remote_path": remote_path, "url": None,
+                                    "success": True, "skipped": True})
+                    continue
+                if remote_dir:
+                    remote_dirs.add(remote_dir)
+                jobs.append((local_path, remote_dir))
+        cache.save()
+
+        if jobs and not self._ensure_folders(site_id, drive_id, remote_dirs, max_workers):
+            return skipped, len(skipped)
+        results = self._upload_files(site_id, drive_id, jobs, max_workers, progress)
+        for result in results:
+            result["skipped"] = False
+        files_ok = sum(1 for r in results if r["success"])
+        self.logger.info(f"Sync summary: {len(skipped)} files unchanged, {files_ok} files uploaded successfully, "
+                         f"{len(results) - files_ok} files failed.")
+        return skipped + results, files_ok + len(skipped)
+
+
+    def _same_content(self, local_path:str, item, cache):
+        # Compare size first; hash the local file only when the remote item has a quickXorHash to compare with
+        if item is None:
+            return False
+        remote_hash = (item.get("hashes") or {}).get("quickXorHash")
+        try:
+            if item.get("size") != os.path.getsize(local_path) or not remote_hash:
+                return False
+            return cache.get_hash(local_path) == remote_hash
+        except OSError as e:
+            self.logger.warning(f"sync_folder: cannot hash {local_path}: {e}")
+            return False
+
+
+    def _ensure_folders(self, site_id, drive_id:str, remote_dirs, max_workers:int=8):
+        # Create every folder (and its parents) once, one depth level at a time
+        all_dirs = set()
+        for remote_dir in remote_dirs:
+            parts = remote_dir.split("/")
+            all_dirs.update("/".join(parts[:i]) for i in range(1, len(parts) + 1))
+
+        levels = {}
+        for d in all_dirs:
+            levels.setdefault(d.count("/"), []).append(d)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for depth in sorted(levels):
+                if not all(executor.map(lambda d: self._create_folder(site_id, drive_id, d), levels[depth])):
+                    return False
+        return True
+
+
+    def _create_folder(self, site_id, drive_id:str, remote_dir:str):
+        # Create a folder; an existing folder (409 Conflict) is fine
+        try:
+            parent, _, name = remote_dir.rpartition("/")
+            if parent:
+                url = f"{self.graph_url}/sites/{site_id}/drives/{drive_id}/root:/{quote(parent)}:/children"
+            else:
+                url = f"{self.graph_url}/sites/{site_id}/drives/{drive_id}/root/children"
+            body = {"name": name, "folder": {}, "@microsoft.graph.conflictBehavior": "fail"}
+            response = self._request("POST", url, json=body)
+            if response.status_code in (200, 201, 409):
+                return True
+            self.logger.error(f"Creating folder {remote_dir} failed: {response.status_code} - {response.text}")
+            return False
+        except Exception as e:
+            self.logger.error(f"Creating folder {remote_dir} failed: {e}")
+            return False
+
+
+    def _upload_files(self, site_id, drive_id:str, jobs, max_workers:int=8, progress=None):
+        # Upload (local_path, remote_dir) pairs concurrently and collect per-file results
+        results = []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(self.upload_file_graph, site_id, drive_id, remote_dir, local_path): (local_path, remote_dir)
+                for local_path, remote_dir in jobs
+            }
+            for future in as_completed(futures):
+                local_path, remote_dir = futures[future]
+                url, success = future.result()
+                result = {
+                    "local_path": local_path,
+                    "remote_path": "/".join(p for p in (remote_dir, os.path.basename(local_path)) if p),
+                    "url": url,
+                    "success": bool(success)
+                }
+                results.append(result)
+                if progress:
+                    progress(len(results), len(jobs), result)
+        return results
+
+
+    def download_file(self, site_id, drive_id:str, remote_path:str, local_path:str, item_id:str=None,
+                      segment_size:int=DOWNLOAD_SEGMENT_SIZE, max_workers:int=4):
+        """
+        Downloads a file from a SharePoint library, streaming it to disk without holding it in memory.
+        Files larger than segment_size are fetched as concurrent HTTP Range requests.
+        Data is written to "<local_path>.part" and completed segments are recorded in "<local_path>.part.json",
+        so an interrupted download resumes with the missing segments when called again (if the file's eTag is unchanged).
+
+        :param site_id: The SharePoint site ID
+        :param drive_id: The drive ID for the desired folder
+        :param remote_path: Path of the file inside the document library (ignored when item_id is given)
+        :param local_path: Destination file, replaced once the download is complete
+        :param item_id: Optional drive item ID of the file instead of remote_path
+        :param segment_size: Bytes per Range request
+        :param max_workers: Number of concurrent Range requests
+        :return: (local_path, success_file_count); on failure the first element holds the error text
+        """
+        try:
+            item = self._get_download_item(site_id, drive_id, remote_path, item_id)
+            size = int(item.get("size") or 0)
+            part_path = f"{local_path}.part"
+            state_path = f"{part_path}.json"
+            segments = [(offset, min(segment_size, size - offset)) for offset in range(0, size, segment_size)]
+
+            # Resume only if the remote file and the segment layout are unchanged
+            state = load_state(state_path)
+            if (state and os.path.exists(part_path) and state.get("eTag") == item.get("eTag")
+                    and state.get("size") == size and state.get("segment_size") == segment_size):
+                done = set(state.get("done", []))
+                self.logger.debug(f"Resuming download of {local_path}: {len(done)}/{len(segments)} segments present")
+            else:
+                os.makedirs(os.path.dirname(os.path.abspath(local_path)), exist_ok=True)
+                with open(part_path, "wb") as f:
+                    f.truncate(size)
+                done = set()
+            state = {"eTag": item.get("eTag"), "size": size, "segment_size": segment_size, "done": sorted(done)}
+            save_state(state_path, state)
+
+            # Download URLs are short-lived; a segment that gets 401/403 fetches a fresh one
+            download = {"url": item["@microsoft.graph.downloadUrl"]}
+            lock = threading.Lock()
+
+            def refresh_url(expired_url):
+                with lock:
+                    if download["url"] == expired_url:
+                        download["url"] = self._get_download_item(site_id, drive_id, remote_path, item_id)[
+                            "@microsoft.graph.downloadUrl"]
+                    return download["url"]
+
+            def fetch(index):
+                offset, length = segments[index]
+                self._download_segment(download["url"], refresh_url, part_path, offset, length, size)
+                with lock:
+                    done.add(index)
+                    state["done"] = sorted(done)
+                    save_state(state_path, state)
+
+            pending = [i for i in range(len(segments)) if i not in done]
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(pending) or 1))) as executor:
+                futures = [executor.submit(fetch, i) for i in pending]
+                try:
+                    for future in as_completed(futures):
+                        future.result()
+                except Exception:
+                    for future in futures:
+                        future.cancel()
+                    raise
+
+            os.replace(part_path, local_path)
+            os.remove(state_path)
+            self.logger.debug(f"Downloaded {size} bytes to {local_path}")
+            return local_path, 1
+        except Exception as e:
+            self.logger.error(f"download_file failed for {item_id or remote_path}: {e}")
+            return str(e), 0
+
+
+    def download_files(self, site_id, drive_id:str, remote_paths, local_folder:str, max_workers:int=4,
+                       segment_workers:int=4, segment_size:int=DOWNLOAD_SEGMENT_SIZE, progress=None):
+        """
+        Downloads several files concurrently, keeping their library paths below local_folder.
+        Up to max_workers * segment_workers requests are in flight at the same time.
+
+        :param site_id: The SharePoint site ID
+        :param drive_id: The drive ID for the desired folder
+        :param remote_paths: Paths inside the document library, or items yielded by crawl_folder
+        :param local_folder: Local directory the files are written to
+        :param max_workers: Number of files downloaded at the same time
+        :param segment_workers: Concurrent Range requests per file
+        :param segment_size: Bytes per Range request
+        :param progress: Optional callback progress(done_count, total_count, result) called after each file
+        :return: (results, success_file_count) where results is a list of dicts
+                 {"remote_path", "local_path", "success", "error"}
+        """
+        jobs = []
+        for entry in remote_paths:
+            if isinstance(entry, dict):
+                if entry.get("is_folder"):
+                    continue
+                remote_path, item_id = entry["path"], entry.get("id")
+            else:
+                remote_path, item_id = entry, None
+            # Never write outside local_folder, whatever the remote path looks like
+            parts = [p for p in remote_path.replace("\\", "/").split("/") if p not in ("", ".", "..")]
+            jobs.append((remote_path, item_id, os.path.join(local_folder, *parts)))
+
+        results = []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(self.download_file, site_id, drive_id, remote_path, local_path, item_id,
+                                segment_size, segment_workers): (remote_path, local_path)
+                for remote_path, item_id, local_path in jobs
+            }
+            for future in as_completed(futures):
+                remote_path, local_path = futures[future]
+                message, success = future.result()
+                result = {
+                    "remote_path": remote_path,
+                    "local_path": local_path,
+                    "success": bool(success),
+                    "error": None if success else message
+                }
+                results.append(result)
+                if progress:
+                    progress(len(results), len(jobs), result)
+        files_ok = sum(1 for r in results if r["success"])
+        self.logger.info(f"Download summary: {files_ok} files downloaded successfully, {len(results) - files_ok} files failed.")
+        return results, files_ok
+
+
+    def _get_download_item(self, site_id, drive_id:str, remote_path:str, item_id:str=None):
+        # Item metadata including the pre-authenticated @microsoft.graph.downloadUrl
+        base = f"{self.graph_url}/sites/{site_id}/drives/{drive_id}"
+        if item_id:
+            url = f"{base}/items/{item_id}"
+        else:
+            path = "/".join(p for p in remote_path.replace("\\", "/").split("/") if p)
+            url = f"{base}/root:/{quote(path)}"
+        response = self._request("GET", url)
+        if response.status_code != 200:
+            raise RuntimeError(f"{response.status_code} - {response.text}")
+        item = response.json()
+        if "file" not in item or "@microsoft.graph.downloadUrl" not in item:
+            raise RuntimeError(f"{item_id or remote_path} is not a file")
+        return item
+
+
+    def _download_segment(self, url, refresh_url, part_path:str, offset:int, length:int, size:int, max_retries:int=3):
+        # Stream bytes offset..offset+length-1 into the part file; the whole file is requested without a Range header
+        headers = {} if length == size else {"Range": f"bytes={offset}-{offset + length - 1}"}
+        failures = 0
+        while True:
+            expired = False
+            try:
+                # Download URLs are pre-authenticated; sending the bearer token is not allowed
+                with self._request("GET", url, headers=headers, auth=False, stream=True) as response:
+                    if response.status_code == 200 and headers:
+                        raise RuntimeError("The server does not support Range requests")
+                    if response.status_code in (200, 206):
+                        written = 0
+                        with open(part_path, "r+b") as f:
+                            f.seek(offset)
+                            for chunk in response.iter_content(DOWNLOAD_BUFFER_SIZE):
+                                f.write(chunk)
+                                written += len(chunk)
+                        if written == length:
+                            return
+                        error = f"received {written} of {length} bytes"
+                    else:
+                        expired = response.status_code in (401, 403)
+                        error = f"{response.status_code} - {response.text}"
+            except RuntimeError:
+                raise
+            except Exception as e:
+                error = str(e)
+
+            failures += 1
+            if failures > max_retries:
+                raise RuntimeError(f"Download of bytes {offset}-{offset + length - 1} failed: {error}")
+            self.logger.warning(f"Download of bytes {offset}-{offset + length - 1} failed ({error}); retrying")
+            if expired:
+                url = refresh_url(url)
+            else:
+                time.sleep(2 ** failures)
+
+
+def _item_path(folder_path:str, name:str):
+    # URL-encoded path of an item relative to the drive root
+    parts = [p for p in (folder_path or "").replace("\\", "/").split("/") if p] + [name]
+    return quote("/".join(parts))
+
+
+def _parse_time(value:str):
+    # Parse Graph ISO 8601 timestamps ("2025-01-29T09:21:55.523Z"); None if missing or invalid
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
+
+
+def _expired(expiration:str):
+    expires = _parse_time(expiration)
+    return expires is not None and expires <= datetime.now(timezone.utc)
+
@@ -0,0 +1,25 @@
+"""
+Small JSON state files (delta links, upload sessions, caches) shared by the Graph modules.
+
+"""
+import json
+import os
+
+
+def load_state(path, default=None):
+    """Return the JSON content of `path`, or `default` if it does not exist or cannot be read."""
+    if not path or not os.path.exists(path):
+        return default
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return default
+
+
+def save_state(path, data):
+    """Write `data` as JSON to `path` atomically (temporary file + rename)."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
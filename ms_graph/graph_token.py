@@ -0,0 +1,232 @@
+"""
+Token provider for app-only Microsoft Graph access with a persistent MSAL token cache.
+
+"""
+import os
+import threading
+import time
+
+
+class token_provider:
+    """
+    Acquire an app-only access token and keep it fresh.
+
+    The MSAL token cache can be persisted to disk, so a new process reuses a still valid token
+    instead of doing a round trip to login.microsoftonline.com. A background timer refreshes the
+    token `refresh_margin` seconds before it expires, so get_token() normally returns without
+    any network I/O. msal is imported and the MSAL application built on the first token request,
+    so creating a token_provider is cheap.
+
+    Attributes:
+        logger: Logger with .debug/.info/.warning/.error methods for logging.
+        cache_path: Optional file used to persist the MSAL serializable token cache.
+        refresh_margin: Seconds before expiry at which the token is refreshed.
+        background_refresh: Refresh the token from a background timer instead of on the caller's thread.
+        shared_cache: Optional token_cache shared with other providers (used instead of cache_path).
+        http_client: Optional requests.Session used by MSAL for token requests, e.g. a shared connection pool.
+    """
+
+    scopes = ["https://graph.microsoft.com/.default"]
+
+    def __init__(self,
+                 client_id,
+                 client_secret,
+                 tenant_id,
+                 logger,
+                 cache_path=None,
+                 refresh_margin=300,
+                 background_refresh=True,
+                 shared_cache=None,
+                 http_client=None):
+
+        self.client_id = client_id
+        self.tenant_id = tenant_id
+        self.logger = logger
+        self.token_cache = shared_cache or token_cache(cache_path, logger)
+        self.cache_path = self.token_cache.path
+        self.http_client = http_client
+        self.refresh_margin = refresh_margin
+        self.background_refresh = background_refresh
+
+        self._lock = threading.RLock()
+        self._token = None
+        self._expires_at = 0.0
+        self._timer = None
+        self._closed = False
+
+        # The MSAL application is built on first use (see _get_app)
+        self._client_secret = client_secret
+        self._authority = f"https://login.microsoftonline.com/{tenant_id}"
+        self.cache = None
+        self.app = None
+
+
+    def get_token(self):
+        """
+        Return a valid access token, or None if no token could be obtained.
+        Only blocks on the network when there is no token yet or it has already expired.
+        """
+        # Hot path: no lock and no network while the current token is valid
+        return self.cached_token() or self.refresh()
+
+
+    def cached_token(self):
+        """Return the current token if it is still valid, otherwise None. Never blocks."""
+        if self._token and time.time() < self._expires_at - 30:
+            return self._token
+        return None
+
+
+    def refresh(self):
+        """Acquire a token (from the cache when still fresh, otherwise from Azure AD) and schedule the next refresh."""
+        with self._lock:
+            # Another thread may have refreshed while we waited for the lock
+            if self._token and time.time() < self._expires_at - self.refresh_margin:
+                return self._token
+            try:
+                app = self._get_app()
+                result = app.acquire_token_for_client(self.scopes)
+
+                # A cached token close to expiry is dropped so MSAL requests a new one
+                if "access_token" in result and int(result.get("expires_in", 0)) <= self.refresh_margin:
+                    self._evict_access_tokens()
+                    result = app.acquire_token_for_client(self.scopes)
+
+                if "access_token" in result:
+                    self._token = result["access_token"]
+                    self._expires_at = time.time() + int(result.get("expires_in", 0))
+                    self.token_cache.save()
+                    self._schedule_refresh(self._expires_at - self.refresh_margin - time.time())
+                    self.logger.debug("Successfully obtained Graph API token.")
+                    return self._token
+
+                # error_description may contain helpful details about why token request failed
+                error_msg = result.get("error_description", str(result))
+                self.logger.error(f"Failed to get token: {error_msg}")
+            except Exception as e:
+                self.logger.error(f"Token refresh failed: {e}")
+
+            # Keep serving the old token while it is still valid and retry shortly
+            if self._token and time.time() < self._expires_at:
+                self._schedule_refresh(30)
+                return self._token
+            return None
+
+
+    def close(self):
+        # Stop the background refresh timer
+        with self._lock:
+            self._closed = True
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+
+
+    def _schedule_refresh(self, delay):
+        if not self.background_refresh or self._closed:
+            return
+        if self._timer:
+            self._timer.cancel()
+        self._timer = threading.Timer(max(delay, 5), self._background_refresh)
+        self._timer.daemon = True
+        self._timer.start()
+
+
+    def _background_refresh(self):
+        # Force the refresh even though the current token is still valid
+        with self._lock:
+            self._expires_at = min(self._expires_at, time.time() + self.refresh_margin)
+        self.refresh()
+
+
+    def _get_app(self):
+        # Importing msal and building the application (authority discovery) is deferred to the first token request
+        with self._lock:
+            if self.app is None:
+                import msal
+
+                # The cache (loaded from disk if persisted) lets a valid token be reused across processes
+                self.cache = self.token_cache.get()
+                options = {"http_client": self.http_client} if self.http_client is not None else {}
+                self.app = msal.ConfidentialClientApplication(
+                    self.client_id,
+                    authority=self._authority,
+                    client_credential=self._client_secret,
+                    token_cache=self.cache,
+                    http_cache=self.token_cache.http_cache,
+                    **options
+                )
+            return self.app
+
+
+    def _evict_access_tokens(self):
+        # Only this app's tokens for this tenant: a shared cache also holds other tenants' tokens
+        import msal
+        query = {"client_id": self.client_id, "realm": self.app.authority.tenant}
+        for at in list(self.cache.search(msal.TokenCache.CredentialType.ACCESS_TOKEN, query=query)):
+            self.cache.remove_at(at)
+
+
+class token_cache:
+    """
+    MSAL token cache that can be persisted to a file and shared by several token providers.
+
+    MSAL keys cached tokens by client ID and tenant, so one cache (and one file) can serve many tenants
+    and apps. msal is imported and the file loaded on first use.
+
+    Attributes:
+        path: Optional file the serialized cache is loaded from and saved to (written with mode 0600).
+        logger: Logger for load/save problems.
+        http_cache: Dict MSAL uses to reuse authority discovery responses between applications.
+
+    Example:
+        shared = token_cache("~/.ms_graph_tokens.json", logger)
+        provider_a = token_provider(client_id, secret, tenant_a, logger, shared_cache=shared)
+        provider_b = token_provider(client_id, secret, tenant_b, logger, shared_cache=shared)
+    """
+
+    def __init__(self, path=None, logger=None):
+        self.path = os.path.expanduser(path) if path else None
+        self.logger = logger
+        self.http_cache = {}
+        self._cache = None
+        self._lock = threading.Lock()
+
+
+    def get(self):
+        # The msal.SerializableTokenCache, created (and loaded from path) on first use
+        with self._lock:
+            if self._cache is None:
+                import msal
+                self._cache = msal.SerializableTokenCache()
+                self._load()
+            return self._cache
+
+
+    def save(self):
+        # Persist the cache if it changed; the lock keeps concurrent providers from writing at the same time
+        with self._lock:
+            if not self.path or self._cache is None or not self._cache.has_state_changed:
+                return
+            try:
+                # Write to a temporary file first so a concurrent reader never sees a partial cache
+                tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    f.write(self._cache.serialize())
+                os.replace(tmp_path, self.path)
+                self._cache.has_state_changed = False
+            except Exception as e:
+                if self.logger:
+                    self.logger.warning(f"Token cache {self.path} could not be saved: {e}")
+
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._cache.deserialize(f.read())
+        except Exception as e:
+            if self.logger:
+                self.logger.warning(f"Token cache {self.path} could not be loaded: {e}")
@@ -0,0 +1,111 @@
+"""
+Chunked uploads to Microsoft Graph upload sessions (drive items and mail attachments).
+
+"""
+import time
+from .ms_graph import _retry_after
+
+
+# Graph requires drive upload chunks to be a multiple of 320 KiB
+CHUNK_MULTIPLE = 320 * 1024
+DEFAULT_CHUNK_SIZE = 16 * CHUNK_MULTIPLE  # 5 MiB
+
+
+def upload_chunks(request,
+                  upload_url,
+                  file,
+                  total_size,
+                  logger,
+                  chunk_size=DEFAULT_CHUNK_SIZE,
+                  offset=0,
+                  max_retries=3):
+    """
+    Upload an open binary file to a pre-authenticated upload session URL in fixed-size chunks.
+
+    Only one chunk is held in memory at a time. After a failed chunk, the session is asked for
+    its nextExpectedRanges and the upload resumes from the last acknowledged byte.
+
+    Args:
+        request: Callable with the signature of ms_graph.request (method, url, headers=None, auth=True, **kwargs).
+        upload_url: The uploadUrl returned by createUploadSession.
+        file: Binary file object opened for reading (must support seek).
+        total_size: Total size of the upload in bytes.
+        logger: Logger instance.
+        chunk_size: Bytes per PUT request.
+        offset: Byte offset to start from (when resuming).
+        max_retries: Consecutive failed chunks tolerated before giving up.
+
+    Returns:
+        The final requests.Response (200/201) containing the created item.
+
+    Raises:
+        RuntimeError if the upload cannot be completed.
+    """
+    position = offset
+    failures = 0
+    while True:
+        if position >= total_size:
+            raise RuntimeError(f"Upload session did not complete after all {total_size} bytes were sent")
+        length = min(chunk_size, total_size - position)
+        file.seek(position)
+        data = file.read(length)
+        headers = {
+            "Content-Length": str(length),
+            "Content-Range": f"bytes {position}-{position + length - 1}/{total_size}"
+        }
+
+        response = None
+        try:
+            # Upload URLs are pre-authenticated; sending the bearer token makes Graph reject the request
+            response = request("PUT", upload_url, headers=headers, auth=False, data=data)
+            if response.status_code in (200, 201, 202):
+                # Intermediate chunks are acknowledged with nextExpectedRanges (202 for drives, 200 for Outlook)
+                status = _json_or_empty(response)
+                if status.get("nextExpectedRanges") or response.status_code == 202:
+                    position = next_expected_offset(status, position + length)
+                    failures = 0
+                    continue
+                return response
+            error = f"{response.status_code} - {response.text}"
+        except Exception as e:
+            error = str(e)
+
+        failures += 1
+        if failures > max_retries or (response is not None and response.status_code == 404):
+            raise RuntimeError(f"Upload session failed at byte {position}: {error}")
+
+        wait = 2 ** failures
+        if response is not None:
+            # Retry-After may also be an HTTP date; then keep the backoff
+            retry_after = _retry_after(response.headers.get("Retry-After"))
+            if retry_after is not None:
+                wait = retry_after
+        logger.warning(f"Chunk at byte {position} failed ({error}); resuming in {wait}s")
+        time.sleep(wait)
+        position = query_upload_session(request, upload_url, default=position)
+
+
+def query_upload_session(request, upload_url, default=0):
+    """Return the next byte offset the upload session expects, or `default` if it cannot be determined."""
+    try:
+        response = request("GET", upload_url, auth=False)
+        if response.status_code == 200:
+            return next_expected_offset(response.json(), default)
+    except Exception:
+        pass
+    return default
+
+
+def next_expected_offset(status, default):
+    # nextExpectedRanges looks like ["26214400-"] or ["0-511", "1024-"]
+    ranges = status.get("nextExpectedRanges") or []
+    if not ranges:
+        return default
+    return int(str(ranges[0]).split("-")[0])
+
+
+def _json_or_empty(response):
+    try:
+        return response.json() or {}
+    except ValueError:
+        return {}
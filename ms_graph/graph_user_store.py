@@ -0,0 +1,201 @@
+"""
+Local, indexed copy of the user directory for fast repeated lookups.
+
+"""
+import json
+import sqlite3
+import threading
+import time
+from .graph_users import users_delta
+
+
+class user_store:
+    """
+    SQLite-backed user directory kept fresh from Microsoft Graph with users/delta.
+
+    The first refresh downloads the directory once; later refreshes only fetch changes. Queries
+    are answered locally and trigger a refresh only when the data is older than `ttl` seconds.
+    displayName, mail, mailNickname, userPrincipalName, jobTitle and companyName are indexed.
+
+    Attributes:
+        gph_object: An initialized ms_graph object.
+        db_path: SQLite database file, or ":memory:" for an in-memory store.
+        ttl: Seconds the local data is considered fresh.
+        select_data: Extra user properties to keep besides the indexed ones.
+
+    Example:
+        store = user_store(gph_object, db_path="users.db", ttl=900)
+        users = store.get_users(search_company="contoso", select_data="displayName,mail")
+    """
+
+    fields = ["displayName", "mail", "mailNickname", "userPrincipalName", "jobTitle", "companyName"]
+
+    def __init__(self, gph_object, db_path=":memory:", ttl=3600, select_data=None):
+        self.gph_object = gph_object
+        self.logger = gph_object.logger
+        self.ttl = ttl
+
+        extra = select_data.split(",") if isinstance(select_data, str) else list(select_data or [])
+        select = ["id"] + self.fields + ["proxyAddresses"] + [f.strip() for f in extra if f.strip()]
+        self.select_data = ",".join(dict.fromkeys(select))
+
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._create_schema()
+
+
+    def _create_schema(self):
+        with self._lock, self.conn:
+            columns = ", ".join(f"{f} TEXT COLLATE NOCASE" for f in self.fields)
+            self.conn.execute(
+                f"CREATE TABLE IF NOT EXISTS users (id TEXT PRIMARY KEY, {columns}, "
+                f"company_lower TEXT, generation INTEGER, data TEXT)"
+            )
+            for f in self.fields:
+                self.conn.execute(f"CREATE INDEX IF NOT EXISTS idx_users_{f} ON users ({f})")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+
+    def refresh(self, force=False):
+        """
+        Bring the local store up to date with users/delta if it is older than the TTL (or when force=True).
+        Returns True if the store is usable, False if the refresh failed.
+        """
+        with self._refresh_lock:
+            if not force and time.time() - float(self._meta("refreshed_at") or 0) < self.ttl:
+                return True
+
+            # A changed property selection invalidates the stored delta link
+            delta_link = self._meta("delta_link") if self._meta("select") == self.select_data else None
+            generation = int(self._meta("generation") or 0) + 1
+
+            def on_page(upserts, deletes, full_sync):
+                self._apply(upserts, deletes, generation if full_sync else None)
+
+            result = users_delta(self.gph_object, delta_link, self.select_data, on_page)
+            if result is None:
+                return False
+            delta_link, full_sync = result
+
+            with self._lock, self.conn:
+                if full_sync:
+                    # Users not seen in a full enumeration no longer exist
+                    self.conn.execute("DELETE FROM users WHERE generation IS NOT ?", (generation,))
+                    self._set_meta("generation", str(generation))
+                self._set_meta("delta_link", delta_link)
+                self._set_meta("select", self.select_data)
+                self._set_meta("refreshed_at", str(time.time()))
+            self.logger.debug(f"User store refreshed (full sync: {full_sync})")
+            return True
+
+
+    def _apply(self, upserts, deletes, generation):
+        with self._lock, self.conn:
+            # Delta pages may only contain changed properties, so merge into the stored record
+            existing = {}
+            ids = [u["id"] for u in upserts if u.get("id")]
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                rows = self.conn.execute(
+                    f"SELECT id, data, generation FROM users WHERE id IN ({','.join('?' * len(chunk))})", chunk
+                )
+                existing.update({row[0]: (json.loads(row[1]), row[2]) for row in rows})
+
+            rows = []
+            for user in upserts:
+                if not user.get("id"):
+                    continue
+                data, old_generation = existing.get(user["id"], ({}, None))
+                data.update({k: v for k, v in user.items() if not k.startswith("@")})
+                rows.append(
+                    [data["id"]] + [data.get(f) for f in self.fields]
+                    + [(data.get("companyName") or "").lower(), generation or old_generation, json.dumps(data)]
+                )
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO users (id, {', '.join(self.fields)}, company_lower, generation, data) "
+                f"VALUES ({', '.join('?' * (len(self.fields) + 4))})",
+                rows
+            )
+            self.conn.executemany("DELETE FROM users WHERE id = ?", [(d,) for d in deletes if d])
+
+
+    def get_users(self,
+                  select_data: str | None = None,
+                  search_name: str | None = None,
+                  search_title: str | None = None,
+                  search_email: str | None = None,
+                  search_alias: str | None = None,
+                  search_company: str | None = None
+                  ) -> list[dict] | None:
+        """
+        Answer a graph_users.get_users query from the local store.
+        Same filters and semantics: startswith matching (case-insensitive) for name, title, email and alias,
+        case-insensitive substring match for company.
+
+        Returns:
+            List of user dicts matching criteria, or None on error.
+        """
+        try:
+            if not self.refresh() and self._meta("refreshed_at") is None:
+                return None
+
+            def prefix(val):
+                return val.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+            where, params = [], []
+            if search_name:
+                where.append("displayName LIKE ? ESCAPE '\\'")
+                params.append(prefix(search_name))
+            if search_title:
+                where.append("jobTitle LIKE ? ESCAPE '\\'")
+                params.append(prefix(search_title))
+            if search_email:
+                where.append("mail LIKE ? ESCAPE '\\'")
+                params.append(prefix(search_email))
+            if search_alias:
+                where.append(
+                    "(userPrincipalName LIKE ? ESCAPE '\\' OR mailNickname LIKE ? ESCAPE '\\' OR EXISTS "
+                    "(SELECT 1 FROM json_each(users.data, '$.proxyAddresses') WHERE lower(value) = ?))"
+                )
+                params += [prefix(search_alias), prefix(search_alias), f"smtp:{search_alias.lower()}"]
+            if search_company:
+                where.append("instr(company_lower, ?) > 0")
+                params.append(search_company.lower())
+
+            sql = "SELECT data FROM users"
+            if where:
+                sql += " WHERE " + " AND ".join(where)
+            with self._lock:
+                rows = self.conn.execute(sql, params).fetchall()
+
+            keys = None
+            if select_data:
+                keys = select_data if isinstance(select_data, list) else [k.strip() for k in select_data.split(",")]
+            users = []
+            for (data,) in rows:
+                user = json.loads(data)
+                if keys:
+                    user = {k: user[k] for k in keys if k in user}
+                users.append(user)
+            self.logger.debug(f"Retrieved {len(users)} users from the local store")
+            return users
+
+        except Exception as e:
+            self.logger.error(f"Exception occurred while searching the user store: {e}")
+            return None
+
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+    def _meta(self, key):
+        with self._lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+
+    def _set_meta(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
@@ -2,56 +2,299 @@
 Basic code to obtain an application token via MSAL to be used with Microsoft Graph.
 
 """
-import msal
+import threading
+import time
+import weakref
+from . import graph_token
+from .graph_batch import graph_batch
+from .graph_metrics import graph_metrics
+from .graph_scheduler import request_scheduler, DEFAULT_LIMITS, THROTTLE_STATUSES
+
+
+GRAPH_URL = "https://graph.microsoft.com/v1.0"
+# One pooled connection per request the scheduler admits for a tenant at first
+DEFAULT_POOL_SIZE = DEFAULT_LIMITS["tenant"][0]
+
+
+def create_session(pool_size=DEFAULT_POOL_SIZE, max_retries=3, backoff_factor=0.5):
+    """
+    Build a requests.Session with a keep-alive connection pool for Microsoft Graph.
+
+    Args:
+        pool_size: Maximum number of pooled connections kept open per host.
+        max_retries: Retries for connection errors and transient 500/502/504 responses on idempotent methods.
+            Throttled 429/503 responses are left to the request_scheduler of ms_graph.request().
+        backoff_factor: Exponential backoff factor between retries.
+
+    Returns:
+        A configured requests.Session that can be shared between several ms_graph objects.
+    """
+    # Imported here so that importing the package does not pay for requests/urllib3
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    retry = Retry(
+        total=max_retries,
+        connect=max_retries,
+        read=max_retries,
+        status=max_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=[500, 502, 504],
+        # POST (e.g. sendMail) is not idempotent, so it is never retried automatically
+        allowed_methods=frozenset(["GET", "HEAD", "PUT", "DELETE", "OPTIONS"]),
+        # Otherwise urllib3 retries 429/503 with Retry-After itself, behind the scheduler's back
+        respect_retry_after_header=False,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
 
 
 class ms_graph:
     """
     Wrapper class to handle app-only authentication and sending email via Microsoft Graph.
 
+    Construction does no I/O: msal is imported, the connection pool created and the token acquired
+    on the first request. Call warm_up() to do this ahead of time.
+
     Attributes:
         logger: Logger with .debug/.info/.warning/.error methods for logging.
         sender: The user (email) that will be used as the "From" / mailbox to send from.
         client_id: Azure AD Application (client) ID used for the OAuth2 client credentials flow.
         client_secret: Confidential value (application secret) for the Azure AD app used to authenticate the app. 
         tenant_id: Azure AD tenant identifier (GUID) or tenant domain used to build the authority URL
+        session: Optional requests.Session to share one connection pool between several ms_graph objects.
+        pool_size: Size of the keep-alive connection pool when a new session is created. The default matches
+            the scheduler's initial tenant budget, so admitted requests do not wait for a pooled connection.
+        max_retries: Retries for transient failures when a new session is created.
+        timeout: Default (connect, read) timeout in seconds applied to every request.
+        token_cache_path: Optional file to persist the MSAL token cache between processes.
+        refresh_margin: Seconds before token expiry at which it is refreshed in the background.
+        graph_url: Graph API root, e.g. a local stand-in server for tests and benchmarks.
+        token_provider: Optional object with get_token()/close() used instead of the MSAL token provider.
+        metrics: Optional graph_metrics to share between several ms_graph objects; every request is recorded in it.
+        scheduler: Optional request_scheduler to share between several ms_graph objects of the same tenant.
+            It limits concurrency per mailbox, site and tenant and retries throttled (429/503) requests.
     """
 
     def __init__(self, 
                  client_id, 
                  client_secret, 
                  tenant_id, 
-                 logger):
+                 logger,
+                 session=None,
+                 pool_size=DEFAULT_POOL_SIZE,
+                 max_retries=3,
+                 timeout=(10, 120),
+                 token_cache_path=None,
+                 refresh_margin=300,
+                 graph_url=GRAPH_URL,
+                 token_provider=None,
+                 metrics=None,
+                 scheduler=None):
         
-        # Set logger and access token placeholder
         self.logger = logger
-        self.access_token = None
+        self.graph_url = graph_url.rstrip("/")
+        self.metrics = metrics or graph_metrics()
+        self.scheduler = scheduler or request_scheduler()
 
-        try:
-            # Build authority URL for tenant
-            authority = f"https://login.microsoftonline.com/{tenant_id}"
-            # Use .default scope for client credentials to get app-level permissions
-            scopes = ["https://graph.microsoft.com/.default"]
-
-            # Create MSAL confidential client app using client credentials
-            app = msal.ConfidentialClientApplication(
-                client_id,
-                authority=authority,
-                client_credential=client_secret
-            )
-
-            # Acquire token for client (app-only)
-            result = app.acquire_token_for_client(scopes)
-
-            # If token obtained, store it. Otherwise log the error.
-            if "access_token" in result:
-                self.access_token = result["access_token"]
-                logger.debug("Successfully obtained Graph API token.")
-            else:
-                # error_description may contain helpful details about why token request failed
-                error_msg = result.get("error_description", str(result))
-                logger.error(f"Failed to get token: {error_msg}")
+        # Use the shared session if provided, otherwise a new pooled session is created on first use
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self._owns_session = session is None
+        self._session = session
+        self._session_lock = threading.Lock()
 
+        # Token provider keeps the token fresh in the background and persists the MSAL cache
+        self.token_provider = token_provider
+        try:
+            if self.token_provider is None:
+                self.token_provider = graph_token.token_provider(
+                    client_id,
+                    client_secret,
+                    tenant_id,
+                    logger,
+                    cache_path=token_cache_path,
+                    refresh_margin=refresh_margin
+                )
         except Exception as e:
             # Catch-all to ensure initialization failure is logged
             logger.error(f"graph_emailer initialization failed: {e}")
+
+
+    @property
+    def session(self):
+        # The pooled requests.Session, created on first use
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    self._session = create_session(pool_size=self.pool_size, max_retries=self.max_retries)
+        return self._session
+
+
+    def warm_up(self, background=True):
+        """
+        Acquire the access token and create the connection pool before the first request.
+
+        Args:
+            background: Do the work on a daemon thread and return immediately.
+
+        Returns:
+            The started threading.Thread when background=True, otherwise True if a token was obtained.
+        """
+        def run():
+            self.session
+            return self.access_token is not None
+
+        if background:
+            thread = threading.Thread(target=run, name="ms_graph-warm-up", daemon=True)
+            thread.start()
+            return thread
+        return run()
+
+
+    @property
+    def access_token(self):
+        # Always return a valid token; refreshing happens in the background shortly before expiry
+        if self.token_provider is None:
+            return None
+        return self.token_provider.get_token()
+
+
+    def request(self, method, url, headers=None, auth=True, max_retries=None, **kwargs):
+        """
+        Send an HTTP request to Microsoft Graph through the pooled session.
+
+        Args:
+            method: HTTP method, e.g. "GET", "POST", "PUT".
+            url: Full request URL.
+            headers: Optional extra headers; the Authorization header is added automatically.
+            auth: Set to False for pre-authenticated URLs (e.g. upload session URLs).
+            max_retries: Retries of a throttled (429/503) response for this call; None uses scheduler.max_retries.
+            **kwargs: Passed to requests.Session.request (params, json, data, stream, ...).
+
+        Returns:
+            requests.Response. Throttled (429/503) responses are retried after Retry-After by the scheduler
+            and only returned once the retries are exhausted. response.attempts holds the number of attempts made.
+            A streamed response (stream=True) keeps its scheduler slot until its body is read or it is closed.
+        """
+        headers = dict(headers or {})
+        kwargs.setdefault("timeout", self.timeout)
+        # A file-like or generator body cannot be sent twice
+        data = kwargs.get("data")
+        replayable = data is None or isinstance(data, (bytes, str, dict, list, tuple))
+
+        if max_retries is None:
+            max_retries = self.scheduler.max_retries
+
+        attempt = 0
+        while True:
+            # The token is fetched first, so a token request never holds a scheduler slot
+            if auth:
+                headers["Authorization"] = f"Bearer {self.access_token}"
+            keys = self.scheduler.acquire(url)
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, headers=headers, **kwargs)
+            except Exception as e:
+                self.scheduler.release(keys)
+                self.metrics.record(method, url, latency=time.perf_counter() - start, error=e)
+                raise
+            stream = kwargs.get("stream", False)
+            self._record(method, url, response, time.perf_counter() - start, stream, attempt)
+            retry_after = _retry_after(response.headers.get("Retry-After"))
+            if response.status_code not in THROTTLE_STATUSES or not replayable or attempt >= max_retries:
+                if stream:
+                    self._release_on_close(response, keys, retry_after, attempt)
+                else:
+                    self.scheduler.release(keys, response.status_code, retry_after, attempt)
+                response.attempts = attempt + 1
+                return response
+            wait = self.scheduler.release(keys, response.status_code, retry_after, attempt)
+
+            # Throttled: the next acquire() waits until the resource's Retry-After has passed
+            attempt += 1
+            self.logger.debug(f"{method} {url} throttled ({response.status_code}), retrying in {wait}s")
+            self.metrics.record_throttle_wait(method, url, wait)
+            response.close()
+
+
+    def _release_on_close(self, response, keys, retry_after, attempt):
+        # Free the slot once the body is read to the end or the response is closed (or garbage collected);
+        # both paths end in raw.release_conn()
+        lock = threading.Lock()
+        pending = [keys]
+
+        def release(scheduler=self.scheduler, status=response.status_code):
+            with lock:
+                if not pending:
+                    return
+                pending.clear()
+            scheduler.release(keys, status, retry_after, attempt)
+
+        raw = response.raw
+        if hasattr(raw, "release_conn"):
+            release_conn = raw.release_conn
+            def release_conn_and_slot():
+                release_conn()
+                release()
+            raw.release_conn = release_conn_and_slot
+        weakref.finalize(response, release)
+
+
+    def _record(self, method, url, response, latency, stream, attempt=0):
+        # Retries done by urllib3 (connection errors, 500/502/504 on idempotent methods) are kept in raw.retries;
+        # attempt > 0 means this attempt is the scheduler retrying a throttled response
+        retries = getattr(getattr(response, "raw", None), "retries", None)
+        history = retries.history if retries is not None else ()
+        request_bytes = int(response.request.headers.get("Content-Length") or 0) if response.request is not None else 0
+        if stream:
+            # Do not read a streamed body just to count it
+            response_bytes = int(response.headers.get("Content-Length") or 0)
+        else:
+            response_bytes = len(response.content or b"")
+        self.metrics.record(
+            method,
+            url,
+            status=response.status_code,
+            latency=latency,
+            request_bytes=request_bytes,
+            response_bytes=response_bytes,
+            retries=len(history) + (1 if attempt else 0),
+            throttled=sum(1 for h in history if h.status in THROTTLE_STATUSES)
+                      + (1 if response.status_code in THROTTLE_STATUSES else 0)
+        )
+
+
+    def batch(self, max_retries=3):
+        """
+        Create a graph_batch that combines queued requests into /$batch calls (20 per round trip).
+
+        Example:
+            with gph_object.batch() as batch:
+                future = batch.add("GET", "/users/someone@contoso.com")
+            user = future.result()
+        """
+        return graph_batch(self, max_retries=max_retries)
+
+
+    def close(self):
+        # Stop background token refresh and close the connection pool, unless it is shared with other objects
+        if self.token_provider is not None:
+            self.token_provider.close()
+        if self._owns_session and self._session is not None:
+            self._session.close()
+
+
+def _retry_after(value):
+    # Retry-After in seconds, or None when missing or given as a date
+    try:
+        return max(float(value), 0)
+    except (TypeError, ValueError):
+        return None
@@ -15,6 +15,11 @@ setup(
         "requests>=2.31",
         "msal>=1.27",
     ],
+    extras_require={
+        "async": ["aiohttp>=3.9"],
+        "parquet": ["pyarrow>=14"],
+        "test": ["pytest>=7"],
+    },
     keywords=["microsoft graph", "graph api", "msal", "email", "office365"],
     classifiers=[
         "Programming Language :: Python :: 3.12",
@@ -0,0 +1,19 @@
+import logging
+import pytest
+from ms_graph.ms_graph import ms_graph
+from ms_graph.graph_fake_server import fake_graph_server, static_token_provider
+
+
+@pytest.fixture
+def server():
+    # Throttled responses ask for no wait, so retries do not slow the suite down
+    with fake_graph_server(retry_after=0, user_count=250, page_size=100) as server:
+        yield server
+
+
+@pytest.fixture
+def gph_object(server):
+    gph_object = ms_graph("client-id", "client-secret", "tenant-id", logging.getLogger("tests"),
+                          graph_url=server.url, token_provider=static_token_provider())
+    yield gph_object
+    gph_object.close()
@@ -0,0 +1,41 @@
+import pytest
+from ms_graph.graph_batch import graph_batch_error
+
+
+def test_throttled_sub_requests_are_requeued(server, gph_object):
+    # First envelope: sub-requests 1 and 3 are throttled; everything after that succeeds
+    decisions = iter([False, False, True, False, True, False])
+    server._throttled = lambda: next(decisions, False)
+    with gph_object.batch() as batch:
+        futures = [batch.add("GET", f"/users?$top=1&$skiptoken={i}") for i in range(5)]
+    assert [f.result()["value"][0]["displayName"] for f in futures] == [f"User {i:06d}" for i in range(5)]
+    # The two throttled sub-requests went out again in a second envelope
+    assert server.stats["requests"] == 2
+
+
+def test_throttled_envelope_is_requeued(server, gph_object):
+    server.throttle(1)
+    with gph_object.batch() as batch:
+        futures = [batch.add("GET", f"/users?$top=1&$skiptoken={i}") for i in range(3)]
+    assert all(f.result()["value"] for f in futures)
+    assert server.stats["throttled"] == 1
+    assert server.stats["requests"] == 2
+
+
+def test_throttled_envelope_is_not_retried_by_the_scheduler(server, gph_object):
+    calls = []
+    request = gph_object.request
+    gph_object.request = lambda method, url, **kwargs: calls.append(kwargs.get("max_retries")) or request(method, url, **kwargs)
+    server.throttle(1)
+    with gph_object.batch() as batch:
+        future = batch.add("GET", "/users?$top=1")
+    assert future.result()["value"]
+    assert calls == [0, 0]
+
+
+def test_sub_requests_fail_once_retries_run_out(server, gph_object):
+    server.throttle(10)
+    with gph_object.batch(max_retries=1) as batch:
+        future = batch.add("GET", "/users?$top=1")
+    with pytest.raises(graph_batch_error):
+        future.result()
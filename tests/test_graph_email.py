@@ -0,0 +1,23 @@
+from ms_graph.graph_email import send_email, split_attachments, LARGE_ATTACHMENT_THRESHOLD
+
+
+def test_attachments_are_routed_by_their_own_encoded_size():
+    small = {"name": "small.txt", "content_bytes": b"s" * 10_000}
+    medium = {"name": "medium.bin", "content_bytes": b"m" * 2_500_000}
+    large = {"name": "large.bin", "content_bytes": b"l" * 4_000_000}
+    # 2.5 MB is 3.3 MB once base64-encoded: it cannot go inline, but the small file after it still can
+    inline, drafted = split_attachments([medium, small, large], LARGE_ATTACHMENT_THRESHOLD)
+    assert inline == [small]
+    assert drafted == [medium, large]
+
+
+def test_send_email_with_small_and_large_draft_attachments(server, gph_object):
+    attachments = [{"name": "medium.bin", "content_bytes": b"m" * 2_500_000},
+                   {"name": "large.bin", "content_bytes": b"l" * 4_000_000},
+                   {"name": "small.txt", "content_bytes": b"s" * 10_000}]
+    result = send_email(gph_object, "Report", "Text", "See attached", "me@contoso.com", "you@contoso.com",
+                        attachments=attachments)
+    assert result == 0
+    assert server.stats["mails"] == 1
+    # Only the 4 MB attachment went through an upload session (the fake server rejects smaller ones)
+    assert server.stats["uploaded_bytes"] == 4_000_000
@@ -0,0 +1,70 @@
+import base64
+import random
+import pytest
+from ms_graph.graph_hash import quick_xor_hash, hash_file, hash_cache
+
+
+# Known answers from the QuickXorHash reference implementation published by Microsoft
+VECTORS = [
+    (b"", "AAAAAAAAAAAAAAAAAAAAAAAAAAA="),
+    (b"hello world", "aCgDG9jwBhDc4Q1yawMZAAAAAAA="),
+    (bytes(range(256)) * 4, "h7xr2dbCayZCQYR9KKhlwDuT4UI="),
+]
+
+
+def reference_hash(data):
+    # Straight port of the reference algorithm, one byte at a time
+    width, shift, bits_in_last_cell = 160, 11, 32
+    cells = [0, 0, 0]
+    index, offset = 0, 0
+    for i in range(min(len(data), width)):
+        is_last = index == len(cells) - 1
+        cell_bits = bits_in_last_cell if is_last else 64
+        xored = 0
+        for j in range(i, len(data), width):
+            xored ^= data[j]
+        if offset <= cell_bits - 8:
+            cells[index] ^= xored << offset
+        else:
+            cells[index] ^= (xored << offset) & ((1 << 64) - 1)
+            cells[0 if is_last else index + 1] ^= xored >> (cell_bits - offset)
+        offset += shift
+        while offset >= cell_bits:
+            index = 0 if is_last else index + 1
+            offset -= cell_bits
+    digest = bytearray(cells[0].to_bytes(8, "little") + cells[1].to_bytes(8, "little") + cells[2].to_bytes(8, "little")[:4])
+    for i, b in enumerate(len(data).to_bytes(8, "little")):
+        digest[12 + i] ^= b
+    return base64.b64encode(bytes(digest)).decode("ascii")
+
+
+@pytest.mark.parametrize("data, expected", VECTORS)
+def test_known_answers(data, expected):
+    hasher = quick_xor_hash()
+    hasher.update(data)
+    assert hasher.b64digest() == expected
+    assert reference_hash(data) == expected
+
+
+@pytest.mark.parametrize("size", [1, 159, 160, 161, 1000, 163840 + 7])
+def test_chunked_updates_match_reference(size):
+    rng = random.Random(size)
+    data = bytes(rng.randrange(256) for _ in range(size))
+    hasher = quick_xor_hash()
+    position = 0
+    while position < size:
+        step = rng.randrange(1, 400)
+        hasher.update(data[position:position + step])
+        position += step
+    assert hasher.b64digest() == reference_hash(data)
+
+
+def test_hash_cache_reuses_unchanged_files(tmp_path):
+    path = tmp_path / "file.bin"
+    path.write_bytes(b"hello world")
+    cache = hash_cache(str(tmp_path / "hashes.json"))
+    assert cache.get_hash(str(path)) == hash_file(str(path)) == VECTORS[1][1]
+    assert cache.get_hash(str(path)) == VECTORS[1][1]
+    assert (cache.hits, cache.misses) == (1, 1)
+    cache.save()
+    assert hash_cache(str(tmp_path / "hashes.json")).get_hash(str(path)) == VECTORS[1][1]
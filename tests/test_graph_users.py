@@ -0,0 +1,62 @@
+from ms_graph.graph_users import sync_users_delta, resolve_users
+
+
+def test_delta_sync_returns_only_changes_after_the_first_run(server, gph_object, tmp_path):
+    state_file = str(tmp_path / "delta.json")
+    first = sync_users_delta(gph_object, state_file, select_data="displayName,mail")
+    assert first["full_sync"] is True
+    assert len(first["upserts"]) == server.user_count
+
+    server.delta_changes = [{"id": "u-1", "displayName": "Renamed"}, {"id": "u-2", "@removed": {"reason": "changed"}}]
+    second = sync_users_delta(gph_object, state_file, select_data="displayName,mail")
+    assert second == {"upserts": [{"id": "u-1", "displayName": "Renamed"}], "deletes": ["u-2"], "full_sync": False}
+
+
+def test_expired_delta_token_restarts_with_a_clean_full_sync(server, gph_object, tmp_path):
+    state_file = str(tmp_path / "delta.json")
+    sync_users_delta(gph_object, state_file)
+
+    # The token expires after the first page of changes was delivered
+    server.page_size = 1
+    server.delta_changes = [{"id": "stale", "@removed": {}}, {"id": "never-delivered"}]
+    events = []
+
+    def on_change(kind, item):
+        events.append(kind)
+        if len(events) == 1:
+            server.expire_delta_tokens()
+
+    result = sync_users_delta(gph_object, state_file, on_change=on_change)
+    assert result["full_sync"] is True
+    assert events[:2] == ["delete", "reset"]
+    assert events[2:] == ["upsert"] * server.user_count
+
+
+
+def test_expired_delta_token_drops_collected_changes(server, gph_object, tmp_path):
+    state_file = str(tmp_path / "delta.json")
+    sync_users_delta(gph_object, state_file)
+
+    server.page_size = 1
+    server.delta_changes = [{"id": "stale", "@removed": {}}, {"id": "never-delivered"}]
+    request = gph_object.request
+
+    def expire_after_first_page(method, url, **kwargs):
+        response = request(method, url, **kwargs)
+        if "deltatoken" in url and "skiptoken" not in url:
+            server.expire_delta_tokens()
+        return response
+
+    gph_object.request = expire_after_first_page
+    result = sync_users_delta(gph_object, state_file)
+    assert result["full_sync"] is True
+    assert result["deletes"] == []
+    assert len(result["upserts"]) == len({u["id"] for u in result["upserts"]}) == server.user_count
+
+
+def test_resolve_users_in_batch(server, gph_object):
+    wanted = [f"user{i}@contoso.com" for i in range(30)] + ["nobody@contoso.com"]
+    result = resolve_users(gph_object, wanted, use_batch=True)
+    assert sorted(result["found"]) == sorted(wanted[:30])
+    assert result["missing"] == ["nobody@contoso.com"]
+    assert result["failed"] == []
@@ -0,0 +1,39 @@
+from ms_graph.graph_scheduler import resource_keys
+
+
+def test_throttled_request_is_retried_until_it_succeeds(server, gph_object):
+    server.throttle(2)
+    response = gph_object.request("GET", f"{server.url}/users")
+    assert response.status_code == 200
+    assert response.attempts == 3
+    assert server.stats["throttled"] == 2
+
+    totals = gph_object.metrics.snapshot()["totals"]
+    assert totals["requests"] == 3
+    assert totals["throttled"] == 2
+    assert totals["retries"] == 2
+    assert totals["throttle_waits"] == 2
+
+
+def test_throttled_response_is_returned_when_retries_run_out(server, gph_object):
+    server.throttle(2)
+    response = gph_object.request("GET", f"{server.url}/users", max_retries=1)
+    assert response.status_code == 429
+    assert response.attempts == 2
+
+
+def test_throttling_halves_the_mailbox_budget(server, gph_object):
+    url = f"{server.url}/users/someone@contoso.com/sendMail"
+    server.throttle(1)
+    assert gph_object.request("POST", url, json={"message": {}}).status_code == 202
+    mailbox = resource_keys(url)[0]
+    assert mailbox == "mailbox:someone@contoso.com"
+    assert gph_object.scheduler.snapshot()[mailbox]["limit"] == 2
+
+
+def test_streamed_response_holds_its_host_slot_until_read(server, gph_object):
+    host = f"host:127.0.0.1:{server.port}"
+    response = gph_object.request("GET", f"{server.root}/download/file.bin", auth=False, stream=True)
+    assert gph_object.scheduler.snapshot()[host]["in_flight"] == 1
+    assert len(b"".join(response.iter_content(64 * 1024))) == server.file_size
+    assert gph_object.scheduler.snapshot()[host]["in_flight"] == 0